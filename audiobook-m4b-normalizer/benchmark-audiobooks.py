@@ -0,0 +1,266 @@
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import platform
+import tempfile
+import subprocess
+import importlib.util
+from multiprocessing import cpu_count
+
+# --- Configuration ---
+NORMALIZER_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "normalize-audiobooks.py")
+DEFAULT_REPORT_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "benchmark_report.json")
+# Allowed drift between a chapter and the source track it was built from (AAC priming and MP3 padding)
+CHAPTER_TOLERANCE_S = 0.25
+# Allowed drift of the whole book against the sum of its sources
+DURATION_TOLERANCE_S = 1.0
+
+# --- Main Logic ---
+
+def main():
+    """Generate a synthetic library, run the normalizer over it at several worker counts, verify and report."""
+    args = parse_args()
+    normalizer = load_normalizer()
+
+    work_dir = args.work_dir or tempfile.mkdtemp(prefix="audiobook-bench-")
+    library_dir = os.path.join(work_dir, "library")
+    print(f"--- Generating synthetic library in {library_dir} ---")
+    generation_start = time.time()
+    expected_books = generate_library(library_dir, args)
+    print(f"Generated {len(expected_books)} books in {time.time() - generation_start:.1f}s\n")
+
+    runs = []
+    for workers in args.workers:
+        runs.append(run_benchmark(normalizer, work_dir, library_dir, expected_books, workers))
+
+    report = {
+        "generated_at": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "host": {"platform": platform.platform(), "python": platform.python_version(), "cpu_count": cpu_count()},
+        "ffmpeg": get_ffmpeg_version(),
+        "library": {
+            "mp3_books": args.mp3_books, "tracks_per_book": args.tracks, "track_seconds": args.track_seconds,
+            "big_books": args.big_books, "big_book_minutes": args.big_book_minutes,
+            "corrupt_books": args.corrupt_books,
+            "books": len(expected_books),
+            "audio_seconds": sum(sum(book["track_durations"]) for book in expected_books.values()),
+        },
+        "runs": runs,
+    }
+    with open(args.report, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+
+    print("\n--- Benchmark Summary ---")
+    for run in runs:
+        print(
+            f"workers={run['workers']:>2} | scan cold {run['scan_cold_seconds']:.2f}s, warm {run['scan_warm_seconds']:.2f}s"
+            f" | conversion {run['conversion_seconds']:.2f}s ({run['realtime_factor']:.1f}x realtime)"
+            f" | verified {run['verification']['passed']}/{run['verification']['checked']}"
+        )
+    print(f"Report written to {args.report}")
+
+    if not args.keep and not args.work_dir:
+        shutil.rmtree(work_dir, ignore_errors=True)
+    if any(run["verification"]["failures"] for run in runs):
+        sys.exit(1)
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Benchmark and verify normalize-audiobooks.py on a synthetic library.")
+    parser.add_argument("--workers", type=lambda v: [int(w) for w in v.split(",")], default=[1, 2, 4],
+                        help="comma separated worker counts to benchmark (default: 1,2,4)")
+    parser.add_argument("--mp3-books", type=int, default=6, help="books made of many short MP3 tracks")
+    parser.add_argument("--tracks", type=int, default=12, help="tracks per MP3 book")
+    parser.add_argument("--track-seconds", type=float, default=5.0, help="length of each MP3 track")
+    parser.add_argument("--big-books", type=int, default=2, help="single-file M4B books")
+    parser.add_argument("--big-book-minutes", type=float, default=5.0, help="length of each M4B book")
+    parser.add_argument("--corrupt-books", type=int, default=1, help="M4A books with one corrupt track")
+    parser.add_argument("--work-dir", help="where to build the library and outputs (kept afterwards)")
+    parser.add_argument("--keep", action="store_true", help="keep the temporary work directory")
+    parser.add_argument("--report", default=DEFAULT_REPORT_FILE, help="JSON report to write")
+    return parser.parse_args()
+
+def load_normalizer():
+    """Imports normalize-audiobooks.py as a module (its file name isn't a valid module name)."""
+    spec = importlib.util.spec_from_file_location("normalize_audiobooks", NORMALIZER_SCRIPT)
+    module = importlib.util.module_from_spec(spec)
+    sys.modules["normalize_audiobooks"] = module
+    spec.loader.exec_module(module)
+    return module
+
+def get_ffmpeg_version():
+    try:
+        result = subprocess.run(["ffmpeg", "-version"], capture_output=True, text=True, check=True)
+        return result.stdout.splitlines()[0]
+    except (OSError, subprocess.CalledProcessError, IndexError):
+        return None
+
+# --- Synthetic Library ---
+
+def generate_library(library_dir, args):
+    """Builds the synthetic library with ffmpeg and returns what each book should turn into.
+
+    The library mixes multi-track MP3 books (every other one without a cover), large single M4B
+    books and M4A books with one corrupt track.
+    """
+    if os.path.exists(library_dir):
+        shutil.rmtree(library_dir)
+    os.makedirs(library_dir)
+    expected = {}
+
+    for b in range(args.mp3_books):
+        dir_name = f"Bench Author{b} - Track Book {b}"
+        book_dir = os.path.join(library_dir, dir_name)
+        os.makedirs(book_dir)
+        durations = []
+        for t in range(args.tracks):
+            duration = args.track_seconds + (t % 3)  # uneven lengths so misplaced chapters show up
+            make_tone(os.path.join(book_dir, f"{t + 1:03d} Chapter {t + 1}.mp3"), duration, 220 + 20 * t, ["-c:a", "libmp3lame", "-b:a", "64k"])
+            durations.append(duration)
+        has_cover = b % 2 == 0
+        if has_cover:
+            make_cover(os.path.join(book_dir, "cover.jpg"), 600)
+        expected[dir_name] = {"track_durations": durations, "chapters": len(durations), "cover": has_cover}
+
+    for b in range(args.big_books):
+        dir_name = f"Bench Author{b} - Big Book {b}"
+        book_dir = os.path.join(library_dir, dir_name)
+        os.makedirs(book_dir)
+        duration = args.big_book_minutes * 60
+        make_tone(os.path.join(book_dir, "book.m4b"), duration, 330, ["-c:a", "aac", "-b:a", "64k"])
+        make_cover(os.path.join(book_dir, "cover.jpg"), 2400)  # oversized, exercises the downscale path
+        expected[dir_name] = {"track_durations": [duration], "chapters": None, "cover": True}
+
+    for b in range(args.corrupt_books):
+        dir_name = f"Bench Author{b} - Corrupt Book {b}"
+        book_dir = os.path.join(library_dir, dir_name)
+        os.makedirs(book_dir)
+        durations = []
+        for t in range(3):
+            duration = args.track_seconds
+            make_tone(os.path.join(book_dir, f"part{t + 1}.m4a"), duration, 440, ["-c:a", "aac", "-b:a", "64k"])
+            durations.append(duration)
+        with open(os.path.join(book_dir, "part4.m4a"), "wb") as f:
+            f.write(b"\0" * 4096)
+        expected[dir_name] = {"track_durations": durations, "chapters": len(durations), "cover": False}
+
+    return expected
+
+def make_tone(path, seconds, frequency, codec_options):
+    ffmpeg_cmd = [
+        "ffmpeg", "-v", "error", "-y", "-f", "lavfi", "-i", f"sine=frequency={frequency}:duration={seconds}",
+        "-ac", "1", *codec_options, path,
+    ]
+    subprocess.run(ffmpeg_cmd, check=True)
+
+def make_cover(path, size):
+    ffmpeg_cmd = ["ffmpeg", "-v", "error", "-y", "-f", "lavfi", "-i", f"testsrc=size={size}x{size}", "-frames:v", "1", path]
+    subprocess.run(ffmpeg_cmd, check=True)
+
+# --- Benchmark ---
+
+def run_benchmark(normalizer, work_dir, library_dir, expected_books, workers):
+    """Runs a cold scan, a warm scan and a full conversion with `workers`, then verifies every book."""
+    print(f"=== Benchmark with {workers} workers ===")
+    run_dir = os.path.join(work_dir, f"workers-{workers}")
+    if os.path.exists(run_dir):
+        shutil.rmtree(run_dir)
+    os.makedirs(run_dir)
+    output_dir = os.path.join(run_dir, "output")
+
+    normalizer.configure({
+        "ROOT_DIR": library_dir,
+        "NORMALIZED_DIR": output_dir,
+        "OUTPUT_DIR_NAME": os.path.basename(output_dir),
+        "METADATA_REPORT_FILE": os.path.join(output_dir, "metadata_report.jsonl"),
+        "METRICS_FILE": os.path.join(output_dir, "metrics.jsonl"),
+        "PROBE_CACHE_FILE": os.path.join(run_dir, "probe_cache.sqlite"),
+        "COVER_CACHE_DIR": os.path.join(run_dir, "cover_cache"),
+        "COVER_LOOKUP_OFFLINE": True,
+        "INCREMENTAL": False,
+        "SCAN_WORKERS": workers,
+        "CONVERSION_WORKERS": workers,
+        "ENCODE_SLOTS": workers,
+    })
+    normalizer.setup_output_directory()
+
+    scan_start = time.time()
+    normal_books, problem_books = normalizer.scan_metadata()
+    scan_cold = time.time() - scan_start
+
+    scan_start = time.time()
+    normalizer.scan_metadata()
+    scan_warm = time.time() - scan_start
+    normalizer.take_stage_times()
+
+    conversion_start = time.time()
+    normalizer.run_conversion(normal_books + problem_books)
+    conversion_seconds = time.time() - conversion_start
+
+    audio_seconds = sum(sum(book["track_durations"]) for book in expected_books.values())
+    verification = verify_outputs(normalizer, output_dir, expected_books)
+    for failure in verification["failures"]:
+        print(f"  [Verify] {failure}")
+
+    return {
+        "workers": workers,
+        "scan_cold_seconds": scan_cold,
+        "scan_warm_seconds": scan_warm,
+        "conversion_seconds": conversion_seconds,
+        "realtime_factor": audio_seconds / conversion_seconds if conversion_seconds else None,
+        "books": {"normal": len(normal_books), "problematic": len(problem_books)},
+        "verification": verification,
+    }
+
+# --- Verification ---
+
+def verify_outputs(normalizer, output_dir, expected_books):
+    """Checks every book's .m4b for duration, chapter boundaries and cover against its sources."""
+    failures = []
+    for dir_name, expected in sorted(expected_books.items()):
+        output_file = os.path.join(output_dir, dir_name, normalizer.get_normalized_filename(dir_name))
+        failures.extend(f"{dir_name}: {problem}" for problem in verify_book(output_file, expected))
+    checked = len(expected_books)
+    failed_books = {failure.split(":", 1)[0] for failure in failures}
+    return {"checked": checked, "passed": checked - len(failed_books), "failures": failures}
+
+def verify_book(output_file, expected):
+    """Returns a list of problems with one output book (empty if it checks out)."""
+    if not os.path.isfile(output_file):
+        return ["output file missing"]
+
+    ffprobe_cmd = ["ffprobe", "-v", "error", "-show_format", "-show_streams", "-show_chapters", "-of", "json", output_file]
+    try:
+        result = subprocess.run(ffprobe_cmd, capture_output=True, text=True, check=True, encoding='utf-8')
+        info = json.loads(result.stdout)
+    except (subprocess.CalledProcessError, ValueError) as e:
+        return [f"unreadable output ({e})"]
+
+    problems = []
+    expected_duration = sum(expected["track_durations"])
+    duration = float(info.get("format", {}).get("duration", 0))
+    if abs(duration - expected_duration) > DURATION_TOLERANCE_S:
+        problems.append(f"duration {duration:.2f}s, expected {expected_duration:.2f}s")
+
+    if expected["chapters"] is not None:
+        chapters = info.get("chapters", [])
+        if len(chapters) != expected["chapters"]:
+            problems.append(f"{len(chapters)} chapters, expected {expected['chapters']}")
+        else:
+            boundary = 0.0
+            for i, (chapter, track_duration) in enumerate(zip(chapters, expected["track_durations"])):
+                boundary += track_duration
+                end = float(chapter["end_time"])
+                # Drift may build up one priming delay per track, so the allowance grows with the index
+                if abs(end - boundary) > CHAPTER_TOLERANCE_S * (i + 1):
+                    problems.append(f"chapter {i + 1} ends at {end:.2f}s, source boundary is {boundary:.2f}s")
+                    break
+
+    has_cover = any(s.get("disposition", {}).get("attached_pic") for s in info.get("streams", []))
+    if has_cover != expected["cover"]:
+        problems.append("cover stream missing" if expected["cover"] else "unexpected cover stream")
+    return problems
+
+if __name__ == "__main__":
+    main()
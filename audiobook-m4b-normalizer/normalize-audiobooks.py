@@ -1,19 +1,90 @@
 import os
+import argparse
 import subprocess
 import shutil
+import signal
 import sys
 import time
 import json
+import sqlite3
+import threading
+import contextlib
+import hashlib
+import math
+import re
+import tempfile
 import requests
-from multiprocessing import Pool, cpu_count
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from concurrent.futures import ThreadPoolExecutor
+from multiprocessing import Pool, BoundedSemaphore, cpu_count
+
+try:
+    from inotify_simple import INotify, flags as inotify_flags
+except ImportError:
+    # Optional: without it, --watch falls back to polling ROOT_DIR
+    INotify = None
 
 # --- Configuration ---
 ROOT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "audiobooks")
 OUTPUT_DIR_NAME = "normalized_audiobooks"
 NORMALIZED_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), OUTPUT_DIR_NAME)
 METADATA_REPORT_FILE = os.path.join(NORMALIZED_DIR, "metadata_report.jsonl")
+# Per-run stage timings, byte counts and throughput, one JSON record per line
+METRICS_FILE = os.path.join(NORMALIZED_DIR, "metrics.jsonl")
 AUDIO_EXTS = ['.mp3', '.m4a', '.m4b']
 IMAGE_EXTS = ['.jpg', '.jpeg', '.png']
+# ffprobe results are cached here (outside NORMALIZED_DIR so they survive between runs)
+PROBE_CACHE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "probe_cache.sqlite")
+# Bump when parse_probe_output changes shape so older cache entries are re-probed
+PROBE_CACHE_VERSION = 3
+# Keep finished books between runs and only rebuild new or changed ones (False wipes NORMALIZED_DIR first)
+INCREMENTAL = True
+# Written into each book's output folder once its .m4b has been built and verified
+MANIFEST_FILENAME = "manifest.json"
+# AAC encodes follow each book's source (see get_encoding_profile): no more channels, sample rate or
+# bitrate than the source has, and at most AAC_MAX_BITRATE_PER_CHANNEL (128k for stereo, 64k for mono)
+AAC_MAX_BITRATE_PER_CHANNEL = 64000
+AAC_MIN_BITRATE = 24000
+AAC_SAMPLE_RATES = [8000, 11025, 12000, 16000, 22050, 24000, 32000, 44100, 48000]
+# Downmix every encoded book to mono (plenty for speech)
+AAC_DOWNMIX_MONO = False
+# Use HE-AAC for books encoded at or below HE_AAC_MAX_BITRATE_PER_CHANNEL (needs ffmpeg built with libfdk_aac)
+HE_AAC = False
+HE_AAC_MAX_BITRATE_PER_CHANNEL = 32000
+# Covers larger than this (in pixels, either side) are downscaled once and cached; smaller JPEG/PNG covers are copied as-is
+COVER_MAX_SIZE = 1400
+COVER_CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "cover_cache")
+# Re-encoded tracks and AAC segments are staged in a per-book folder here, never in NORMALIZED_DIR (None = system temp dir)
+SCRATCH_DIR = None
+# Optional EBU R128 loudness stage: one gain per book brings it to LOUDNESS_TARGET_LUFS. Books that are
+# re-encoded anyway always get the gain; stream-copy books are only re-encoded when off by more than the tolerance
+LOUDNESS_NORMALIZATION = False
+LOUDNESS_TARGET_LUFS = -18.0
+LOUDNESS_TOLERANCE_LU = 2.0
+LOUDNESS_MAX_GAIN_DB = 20.0
+# Parallel book conversions (processes)
+CONVERSION_WORKERS = cpu_count()
+# Encode multi-track MP3 books one track per core, then stream-copy the AAC segments together
+PARALLEL_TRACK_ENCODING = True
+# Concurrent ffmpeg encodes allowed across all pool workers; books and their tracks share these slots
+ENCODE_SLOTS = cpu_count()
+# Threads used by the metadata pre-scan; it waits on ffprobe and HTTP, not the CPU, so this can exceed cpu_count()
+SCAN_WORKERS = 16
+# Open Library endpoints (point these at a local server to test without the network)
+OPEN_LIBRARY_SEARCH_URL = "http://openlibrary.org/search.json"
+OPEN_LIBRARY_COVER_URL = "http://covers.openlibrary.org/b/isbn/{isbn}-L.jpg"
+# At most this many Open Library requests are in flight at once, over one keep-alive session
+COVER_LOOKUP_WORKERS = 4
+COVER_LOOKUP_TIMEOUT = 10
+COVER_LOOKUP_RETRIES = 3
+# Failed lookups are remembered for this long before Open Library is asked again
+COVER_LOOKUP_NEGATIVE_TTL_DAYS = 30
+# Only use previously cached lookups and covers; never contact Open Library
+COVER_LOOKUP_OFFLINE = False
+# Watch mode: a new book directory must be unchanged for this long before it is converted
+WATCH_SETTLE_SECONDS = 120
+WATCH_POLL_SECONDS = 30
 
 # --- Main Logic ---
 
@@ -23,50 +94,385 @@ def main():
         sys.stdout.reconfigure(encoding='utf-8')
         sys.stderr.reconfigure(encoding='utf-8')
 
+    args = parse_args()
+    configure(get_settings(args))
+    if HE_AAC and not has_ffmpeg_encoder("libfdk_aac"):
+        print("[Warning] This ffmpeg has no libfdk_aac encoder; books will be encoded as AAC-LC instead of HE-AAC.")
+
     # 1. Setup output directory
     setup_output_directory()
 
     # 2. Perform metadata pre-scan
     print("--- Starting Metadata Scan ---")
+    scan_start = time.time()
     normal_books, problem_books = scan_metadata()
+    write_metrics({
+        "event": "scan",
+        "books": len(normal_books) + len(problem_books),
+        "files": sum(len(b['audio_files']) for b in normal_books + problem_books),
+        "elapsed": time.time() - scan_start,
+        "stages": take_stage_times(),
+    })
     print(f"--- Metadata Scan Complete ---")
     print(f"Found {len(normal_books)} normal books and {len(problem_books)} problematic books to process.")
     print(f"A detailed report is available in {METADATA_REPORT_FILE}\n")
 
-    # 3. Process normal books with user confirmation
+    # 3. Confirm normal books, then problematic books separately
+    books_to_process = []
     if normal_books:
         print("--- Planned Conversion (Normal Books) ---")
         for book in normal_books:
             print(f"- {book['dir_name']}")
         print()
 
-        if not get_user_confirmation("Do you want to proceed with the conversion of normal books? (y/n): "):
+        if not (args.yes or get_user_confirmation("Do you want to proceed with the conversion of normal books? (y/n): ")):
             print("Conversion cancelled by user. Exiting.")
             sys.exit(0)
+        books_to_process.extend(normal_books)
 
-        num_processes = min(cpu_count(), len(normal_books))
-        print(f"--- Starting Normal Audiobook Conversion using {num_processes} parallel processes ---")
-        with Pool(processes=num_processes) as pool:
-            pool.map(process_book_task, normal_books)
-
-    # 4. Process problematic books with separate user confirmation
     if problem_books:
         print("\n--- Planned Conversion (Problematic Books) ---")
         for book in problem_books:
             print(f"- {book['dir_name']}")
         print()
 
-        if get_user_confirmation("Some books were identified as problematic (e.g., ffprobe errors). Do you want to attempt to process them? (y/n): "):
-            num_processes = min(cpu_count(), len(problem_books))
-            print(f"--- Starting Problematic Audiobook Conversion using {num_processes} parallel processes ---")
-            with Pool(processes=num_processes) as pool:
-                pool.map(process_book_task, problem_books)
+        if should_process_problem_books(args, "Some books were identified as problematic (e.g., ffprobe errors). Do you want to attempt to process them? (y/n): "):
+            books_to_process.extend(problem_books)
         else:
             print("Problematic book conversion skipped by user.")
 
+    # 4. Convert everything through one pool, most expensive books first
+    if books_to_process:
+        run_conversion(books_to_process)
+
+    # 5. Optionally keep running and convert books as they are added
+    if args.watch:
+        watch_for_new_books(args, normal_books + problem_books)
+
     print("\n--- Normalization Process Complete ---")
     print(f"Your normalized audiobooks are in: {NORMALIZED_DIR}")
 
+def parse_args():
+    """Command line flags; each overrides the matching setting in the Configuration section."""
+    parser = argparse.ArgumentParser(
+        description="Normalize a library of audiobooks into chaptered .m4b files.",
+        fromfile_prefix_chars="@",
+        epilog="Flags can also be read from a file, one per line: normalize-audiobooks.py @headless.conf",
+    )
+    parser.add_argument("--root", default=ROOT_DIR, help="directory containing one folder per book")
+    parser.add_argument("--output", default=NORMALIZED_DIR, help="directory for the normalized books and reports")
+    parser.add_argument("--workers", type=int, default=CONVERSION_WORKERS, help="parallel book conversions")
+    parser.add_argument("--scan-workers", type=int, default=SCAN_WORKERS, help="threads for the metadata scan")
+    parser.add_argument("--encode-slots", type=int, default=ENCODE_SLOTS, help="concurrent ffmpeg encodes across all workers")
+    parser.add_argument("-y", "--yes", action="store_true", help="don't ask for confirmation before converting")
+    parser.add_argument(
+        "--problem-books", choices=["ask", "process", "skip"], default="ask",
+        help="what to do with books that failed to probe (with --yes or --watch, 'ask' means skip)",
+    )
+    parser.add_argument("--scratch-dir", default=SCRATCH_DIR, help="local directory for intermediate files (default: system temp)")
+    parser.add_argument("--full", action="store_true", help="wipe the output directory and rebuild every book")
+    parser.add_argument("--offline-covers", action="store_true", help="only use cached cover art lookups")
+    parser.add_argument("--mono", action="store_true", help="downmix encoded books to mono")
+    parser.add_argument("--he-aac", action="store_true", help="encode low-bitrate books as HE-AAC (needs libfdk_aac)")
+    parser.add_argument("--loudness", action="store_true", help="normalize each book to --loudness-target (EBU R128)")
+    parser.add_argument("--loudness-target", type=float, default=LOUDNESS_TARGET_LUFS, help="target integrated loudness in LUFS")
+    parser.add_argument("--watch", action="store_true", help="after the first pass, keep converting books as they appear")
+    parser.add_argument("--settle", type=float, default=WATCH_SETTLE_SECONDS, help="seconds a new book must be unchanged before conversion")
+    parser.add_argument("--poll-interval", type=float, default=WATCH_POLL_SECONDS, help="seconds between checks when inotify is unavailable")
+    return parser.parse_args()
+
+def get_settings(args):
+    """Maps parsed flags onto the module-level settings they replace."""
+    output_dir = os.path.abspath(args.output)
+    return {
+        "ROOT_DIR": os.path.abspath(args.root),
+        "NORMALIZED_DIR": output_dir,
+        "OUTPUT_DIR_NAME": os.path.basename(output_dir),
+        "METADATA_REPORT_FILE": os.path.join(output_dir, "metadata_report.jsonl"),
+        "METRICS_FILE": os.path.join(output_dir, "metrics.jsonl"),
+        "CONVERSION_WORKERS": max(1, args.workers),
+        "SCAN_WORKERS": max(1, args.scan_workers),
+        "ENCODE_SLOTS": max(1, args.encode_slots),
+        "INCREMENTAL": INCREMENTAL and not args.full,
+        "SCRATCH_DIR": os.path.abspath(args.scratch_dir) if args.scratch_dir else None,
+        "COVER_LOOKUP_OFFLINE": COVER_LOOKUP_OFFLINE or args.offline_covers,
+        "AAC_DOWNMIX_MONO": AAC_DOWNMIX_MONO or args.mono,
+        "HE_AAC": HE_AAC or args.he_aac,
+        "LOUDNESS_NORMALIZATION": LOUDNESS_NORMALIZATION or args.loudness,
+        "LOUDNESS_TARGET_LUFS": args.loudness_target,
+        "WATCH_SETTLE_SECONDS": args.settle,
+        "WATCH_POLL_SECONDS": args.poll_interval,
+    }
+
+def configure(settings):
+    """Overrides the Configuration globals. Pool workers call this too, so it also works under spawn."""
+    globals().update(settings)
+
+def should_process_problem_books(args, prompt):
+    """Applies the --problem-books policy, only prompting when running interactively."""
+    if args.problem_books != "ask":
+        return args.problem_books == "process"
+    if args.yes or args.watch:
+        return False
+    return get_user_confirmation(prompt)
+
+def watch_for_new_books(args, scanned_books):
+    """Keeps converting book directories as they appear in (or change under) ROOT_DIR.
+
+    A directory is only picked up once its listing (names, sizes, mtimes) has stayed the same for
+    WATCH_SETTLE_SECONDS, so books still being copied in are left alone. inotify, when available,
+    just wakes the loop early; the settle check is the same either way.
+
+    `scanned_books` are the books of the initial scan. Their listings as that scan saw them count as
+    seen, so anything added or changed while the first pass was converting is picked up here.
+    """
+    print(f"\n--- Watching {ROOT_DIR} for new books (Ctrl+C to stop) ---")
+    seen = {book["dir_name"]: book["signature"] for book in scanned_books}
+    pending = {}
+    watcher = start_inotify() if INotify is not None else None
+    if watcher is None:
+        print(f"  [Watch] inotify unavailable, polling every {WATCH_POLL_SECONDS:.0f}s")
+
+    num_processes = max(1, CONVERSION_WORKERS)
+    encode_slots = BoundedSemaphore(ENCODE_SLOTS)
+    totals = new_conversion_totals()
+    run_start = time.time()
+    submitted = 0
+    done = 0
+
+    def on_result(result):
+        nonlocal done
+        done += 1
+        report_result(result, f"({done}/{submitted})", totals, time.time() - run_start, num_processes)
+
+    def on_error(error):
+        print(f"[Error] Book task failed: {error}")
+
+    with Pool(processes=num_processes, initializer=init_worker, initargs=(encode_slots, get_current_settings())) as pool:
+        try:
+            while True:
+                wait_for_changes(watcher, min(WATCH_POLL_SECONDS, WATCH_SETTLE_SECONDS))
+                now = time.time()
+                ready = []
+                for dir_name in list_book_dirs():
+                    signature = get_dir_signature(os.path.join(ROOT_DIR, dir_name))
+                    if seen.get(dir_name) == signature:
+                        pending.pop(dir_name, None)
+                    elif dir_name not in pending or pending[dir_name][0] != signature:
+                        pending[dir_name] = (signature, now)
+                    elif now - pending[dir_name][1] >= WATCH_SETTLE_SECONDS:
+                        ready.append(dir_name)
+                if not ready:
+                    continue
+
+                seen.update((dir_name, pending.pop(dir_name)[0]) for dir_name in ready)
+                normal_books, problem_books = scan_metadata(ready)
+                # A book counts as seen as the scan listed it, plus any cover the scan downloaded
+                for book in normal_books + problem_books:
+                    seen[book["dir_name"]] = book["signature"]
+
+                for book in problem_books:
+                    if should_process_problem_books(args, None):
+                        normal_books.append(book)
+                    else:
+                        print(f"[Skipped] Problematic book (see --problem-books): {book['dir_name']}")
+                for book in sorted(normal_books, key=estimate_book_cost, reverse=True):
+                    print(f"[Queued] {book['dir_name']}")
+                    submitted += 1
+                    pool.apply_async(process_book_task, (book,), callback=on_result, error_callback=on_error)
+        except KeyboardInterrupt:
+            print("\nStopping watch; waiting for queued books to finish...")
+            pool.close()
+            pool.join()
+
+    if submitted:
+        write_metrics({"event": "conversion", "books": submitted, "workers": num_processes, "elapsed": time.time() - run_start, **totals})
+
+def list_book_dirs():
+    """Sorted names of the book directories under ROOT_DIR."""
+    return [
+        dir_name for dir_name in sorted(os.listdir(ROOT_DIR))
+        if os.path.isdir(os.path.join(ROOT_DIR, dir_name)) and dir_name != OUTPUT_DIR_NAME
+        and os.path.join(ROOT_DIR, dir_name) != NORMALIZED_DIR
+    ]
+
+def get_dir_signature(dir_path):
+    """Names, sizes and mtimes of a directory's files; it changes while a book is still being copied."""
+    try:
+        with os.scandir(dir_path) as entries:
+            return tuple(sorted((e.name, e.stat().st_size, e.stat().st_mtime_ns) for e in entries))
+    except OSError:
+        return None
+
+def signature_with_file(signature, path):
+    """A directory signature updated with the current size and mtime of one file in it."""
+    if signature is None:
+        return None
+    name = os.path.basename(path)
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return signature
+    return tuple(sorted([entry for entry in signature if entry[0] != name] + [(name, stat.st_size, stat.st_mtime_ns)]))
+
+def start_inotify():
+    """Watches ROOT_DIR and each book directory for writes, or returns None if that fails."""
+    try:
+        watcher = INotify()
+        mask = inotify_flags.CREATE | inotify_flags.MOVED_TO | inotify_flags.CLOSE_WRITE | inotify_flags.DELETE
+        watcher.add_watch(ROOT_DIR, mask)
+        for dir_name in list_book_dirs():
+            watcher.add_watch(os.path.join(ROOT_DIR, dir_name), mask)
+        return (watcher, mask)
+    except OSError as e:
+        print(f"  [Watch] Could not start inotify ({e})")
+        return None
+
+def wait_for_changes(watcher, timeout):
+    """Sleeps until something changes under ROOT_DIR (with inotify) or for `timeout` seconds."""
+    if watcher is None:
+        time.sleep(timeout)
+        return
+    inotify, mask = watcher
+    for event in inotify.read(timeout=int(timeout * 1000)):
+        if event.mask & inotify_flags.ISDIR and event.mask & (inotify_flags.CREATE | inotify_flags.MOVED_TO):
+            # A new book directory; watch it so files landing inside it wake us too
+            try:
+                inotify.add_watch(os.path.join(ROOT_DIR, event.name), mask)
+            except OSError:
+                pass
+
+def run_conversion(books):
+    """Converts books on a single pool, scheduling the most expensive ones first.
+
+    Books are handed out one at a time (chunksize 1), so an idle worker always takes the next
+    book in line and a few huge books can't end up queued behind everything else. Results are
+    reported as each book finishes.
+    """
+    books = sorted(books, key=estimate_book_cost, reverse=True)
+    # Every ffmpeg encode, whether a whole book or a single track, must hold one of these slots
+    encode_slots = BoundedSemaphore(ENCODE_SLOTS)
+
+    num_processes = min(CONVERSION_WORKERS, len(books))
+    print(f"--- Starting Audiobook Conversion of {len(books)} books using {num_processes} parallel processes ---")
+    totals = new_conversion_totals()
+    run_start = time.time()
+    with Pool(processes=num_processes, initializer=init_worker, initargs=(encode_slots, get_current_settings())) as pool:
+        for done, result in enumerate(pool.imap_unordered(process_book_task, books, chunksize=1), start=1):
+            report_result(result, f"({done}/{len(books)})", totals, time.time() - run_start, num_processes)
+
+    write_metrics({
+        "event": "conversion",
+        "books": len(books),
+        "workers": num_processes,
+        "elapsed": time.time() - run_start,
+        **totals,
+    })
+
+def new_conversion_totals():
+    """Running totals that report_result accumulates into."""
+    return {"busy": 0.0, "bytes_in": 0, "bytes_out": 0, "audio_seconds": 0.0, "stages": {}}
+
+def report_result(result, progress, totals, wall_seconds, num_processes):
+    """Prints a finished book, records it in METRICS_FILE and adds it to the running totals."""
+    if result["status"] == "skipped":
+        print(f"[Skipped] {progress} Up to date: {result['dir_name']}")
+    elif result["status"] == "failed":
+        print(f"[Failed] {progress} Book: {result['dir_name']} | Time: {result['elapsed']:.2f}s | Will be rebuilt next run")
+    else:
+        print(f"[Finished] {progress} Book: {result['dir_name']} | Time: {result['elapsed']:.2f}s | Output: {result['output']}")
+
+    write_metrics({"event": "book", **result})
+    totals["busy"] += result["elapsed"]
+    for key in ("bytes_in", "bytes_out", "audio_seconds"):
+        totals[key] += result[key]
+    for stage, seconds in result["stages"].items():
+        totals["stages"][stage] = totals["stages"].get(stage, 0.0) + seconds
+    print(format_progress(totals, wall_seconds, num_processes))
+
+def format_progress(totals, wall_seconds, num_processes):
+    """One-line aggregate view of the conversion so far, printed by the parent after each book."""
+    wall_seconds = max(wall_seconds, 1e-6)
+    utilization = totals["busy"] / (wall_seconds * num_processes)
+    slowest = max(totals["stages"].items(), key=lambda item: item[1], default=("-", 0.0))
+    return (
+        f"[Progress] {totals['audio_seconds'] / 3600:.1f}h audio at {totals['audio_seconds'] / wall_seconds:.1f}x realtime"
+        f" | {totals['bytes_in'] / 1048576:.0f} MB in, {totals['bytes_out'] / 1048576:.0f} MB out"
+        f" | workers {utilization:.0%} busy | most time in: {slowest[0]} ({slowest[1]:.1f}s)"
+    )
+
+def write_metrics(record):
+    """Appends one timestamped record to METRICS_FILE."""
+    with open(METRICS_FILE, "a", encoding="utf-8") as f:
+        f.write(json.dumps({"time": time.time(), **record}) + "\n")
+
+_stage_times = {}
+_stage_lock = threading.Lock()
+
+@contextlib.contextmanager
+def timed_stage(stage):
+    """Adds the wall time spent inside the block to this process's running total for `stage`.
+
+    Threads add to the same totals, so parallel track encodes can sum to more than the wall time.
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        with _stage_lock:
+            _stage_times[stage] = _stage_times.get(stage, 0.0) + elapsed
+
+def take_stage_times():
+    """Returns this process's per-stage totals and starts counting from zero again."""
+    with _stage_lock:
+        times = dict(_stage_times)
+        _stage_times.clear()
+    return times
+
+def estimate_book_cost(book):
+    """Rough conversion cost of a book in seconds of work, used only to order the queue.
+
+    Stream copies cost roughly their size in I/O; re-encodes additionally cost their duration.
+    Whether a book is re-encoded is decided as process_book_task decides it (a loudness re-encode
+    can't be known before the book is measured).
+    """
+    audio_files = book['audio_files']
+    durations = [probe_audio_file(f)["duration"] or 0.0 for f in audio_files]
+    total_bytes = sum(os.path.getsize(f) for f in audio_files if os.path.exists(f))
+
+    is_single_m4b = len(audio_files) == 1 and audio_files[0].lower().endswith('.m4b')
+    needs_encode = not is_single_m4b and not can_stream_copy(audio_files, get_encoding_profile(audio_files))
+
+    cost = total_bytes / (100 * 1024 * 1024)  # ~100 MB/s copy throughput
+    if needs_encode:
+        cost += sum(durations) / 50  # ~50x realtime for a single-threaded AAC encode
+    return cost
+
+_encode_slots = None
+
+def init_worker(encode_slots, settings):
+    """Pool initializer: shares the parent's encode slots and settings with each worker process."""
+    global _encode_slots
+    _encode_slots = encode_slots
+    configure(settings)
+    # Ctrl+C is handled by the parent, which decides whether to wait for or terminate the workers
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+def get_current_settings():
+    """The settings configure() may have changed, to hand on to pool workers."""
+    names = [
+        "ROOT_DIR", "NORMALIZED_DIR", "OUTPUT_DIR_NAME", "METADATA_REPORT_FILE", "METRICS_FILE",
+        "CONVERSION_WORKERS", "SCAN_WORKERS", "ENCODE_SLOTS", "INCREMENTAL", "COVER_LOOKUP_OFFLINE",
+        "LOUDNESS_NORMALIZATION", "LOUDNESS_TARGET_LUFS", "WATCH_SETTLE_SECONDS", "WATCH_POLL_SECONDS",
+        "PROBE_CACHE_FILE", "COVER_CACHE_DIR", "SCRATCH_DIR", "AAC_DOWNMIX_MONO", "HE_AAC",
+    ]
+    return {name: globals()[name] for name in names}
+
+def encode_slot():
+    """Context manager that holds one shared encode slot (a no-op outside the pool)."""
+    return _encode_slots if _encode_slots is not None else contextlib.nullcontext()
+
 def get_user_confirmation(prompt):
     while True:
         try:
@@ -103,67 +509,76 @@ def get_book_details(dir_name):
     return {"author": author, "title": title}
 
 
-def scan_metadata():
-    """Scan all book directories, report missing metadata, and return a list of tasks."""
-    books_to_process = []
+def scan_metadata(dir_names=None):
+    """Scan all book directories, report missing metadata, and return a list of tasks.
+
+    Every audio file of every book is probed concurrently (and missing covers are fetched
+    alongside), then the results are collected back in sorted directory order. Passing
+    `dir_names` scans just those books and appends them to the existing report (watch mode).
+    """
     normal_books = []
     problem_books = []
 
-    # Use a temporary name for the report file to avoid conflict
-    temp_report_path = os.path.join(ROOT_DIR, "metadata_report.jsonl.tmp")
-
-    with open(temp_report_path, "w", encoding="utf-8") as report:
-        for dir_name in sorted(os.listdir(ROOT_DIR)):
-            dir_path = os.path.join(ROOT_DIR, dir_name)
-            if not os.path.isdir(dir_path) or dir_name == OUTPUT_DIR_NAME:
-                continue
-
-            audio_files = []
-            image_file = None
-            is_problematic = False
-            
-            book_details = get_book_details(dir_name)
-            clean_title = book_details["title"]
-
-            for item in sorted(os.listdir(dir_path)):
-                file_ext = os.path.splitext(item)[1].lower()
-                if file_ext in AUDIO_EXTS:
-                    full_audio_path = os.path.join(dir_path, item)
-                    audio_files.append(full_audio_path)
-                    if get_audio_duration(full_audio_path) is None:
-                        is_problematic = True
-                elif file_ext in IMAGE_EXTS and not image_file:
-                    image_file = os.path.join(dir_path, item)
-            
-            if not audio_files:
-                continue
-
-            if not image_file:
-                # Pass the cleaned title to the cover art downloader
-                image_file = download_cover_art(clean_title, dir_path)
-
-            metadata_status = {
-                "book_title": dir_name,
-                "cleaned_title": clean_title,
-                "audio_files_found": len(audio_files),
-                "cover_art_found": image_file is not None,
-                "is_problematic": is_problematic
-            }
-            report.write(json.dumps(metadata_status) + "\n")
-            
-            book_info = {
-                "dir_path": dir_path,
-                "dir_name": dir_name,
-                "audio_files": audio_files,
-                "image_file": image_file,
-                "is_problematic": is_problematic
-            }
-
-            if is_problematic:
-                problem_books.append(book_info)
-            else:
-                normal_books.append(book_info)
-    
+    books = []
+    for dir_name in sorted(dir_names) if dir_names is not None else list_book_dirs():
+        dir_path = os.path.join(ROOT_DIR, dir_name)
+        book = list_book_files(dir_path, dir_name)
+        if book["audio_files"]:
+            books.append(book)
+
+    with ThreadPoolExecutor(max_workers=SCAN_WORKERS) as executor:
+        duration_futures = {
+            audio_file: executor.submit(get_audio_duration, audio_file)
+            for book in books
+            for audio_file in book["audio_files"]
+        }
+        cover_futures = {
+            book["dir_path"]: executor.submit(download_cover_art, book["clean_title"], book["dir_path"])
+            for book in books
+            if not book["image_file"]
+        }
+
+        # Use a temporary name for the report file to avoid conflict
+        temp_report_path = os.path.join(ROOT_DIR, "metadata_report.jsonl.tmp")
+        if dir_names is not None:
+            temp_report_path = METADATA_REPORT_FILE
+
+        with open(temp_report_path, "a" if dir_names is not None else "w", encoding="utf-8") as report:
+            for book in books:
+                audio_files = book["audio_files"]
+                is_problematic = any(duration_futures[f].result() is None for f in audio_files)
+                image_file = book["image_file"]
+                if not image_file:
+                    image_file = cover_futures[book["dir_path"]].result()
+                    if image_file:
+                        book["signature"] = signature_with_file(book["signature"], image_file)
+
+                metadata_status = {
+                    "book_title": book["dir_name"],
+                    "cleaned_title": book["clean_title"],
+                    "audio_files_found": len(audio_files),
+                    "cover_art_found": image_file is not None,
+                    "is_problematic": is_problematic
+                }
+                report.write(json.dumps(metadata_status) + "\n")
+
+                book_info = {
+                    "dir_path": book["dir_path"],
+                    "dir_name": book["dir_name"],
+                    "audio_files": audio_files,
+                    "image_file": image_file,
+                    "is_problematic": is_problematic,
+                    "signature": book["signature"],
+                }
+
+                if is_problematic:
+                    problem_books.append(book_info)
+                else:
+                    normal_books.append(book_info)
+
+    if dir_names is not None:
+        return normal_books, problem_books
+
     # Move the temporary report to the final destination
     if os.path.exists(METADATA_REPORT_FILE):
         os.remove(METADATA_REPORT_FILE)
@@ -171,23 +586,53 @@ def scan_metadata():
 
     return normal_books, problem_books
 
+def list_book_files(dir_path, dir_name):
+    """Collects a book directory's audio files and first cover image, without probing anything."""
+    # Taken before listing, so a file landing in between shows up as a change in watch mode
+    signature = get_dir_signature(dir_path)
+    audio_files = []
+    image_file = None
+    for item in sorted(os.listdir(dir_path)):
+        file_ext = os.path.splitext(item)[1].lower()
+        if file_ext in AUDIO_EXTS:
+            audio_files.append(os.path.join(dir_path, item))
+        elif file_ext in IMAGE_EXTS and not image_file:
+            image_file = os.path.join(dir_path, item)
+
+    return {
+        "dir_path": dir_path,
+        "dir_name": dir_name,
+        "clean_title": get_book_details(dir_name)["title"],
+        "audio_files": audio_files,
+        "image_file": image_file,
+        "signature": signature,
+    }
+
 
 def setup_output_directory():
-    """Create or clear the output directory for a clean run."""
+    """Create the output directory, clearing it first unless running incrementally."""
     if not os.path.exists(NORMALIZED_DIR):
         print(f"Creating output directory: {NORMALIZED_DIR}")
         os.makedirs(NORMALIZED_DIR)
+    elif INCREMENTAL:
+        print(f"Incremental mode: keeping up-to-date books in {NORMALIZED_DIR}")
+        if os.path.exists(METRICS_FILE):
+            os.remove(METRICS_FILE)
     else:
         print(f"Clearing output directory: {NORMALIZED_DIR}")
-        for item in os.listdir(NORMALIZED_DIR):
-            item_path = os.path.join(NORMALIZED_DIR, item)
-            try:
-                if os.path.isfile(item_path) or os.path.islink(item_path):
-                    os.unlink(item_path)
-                elif os.path.isdir(item_path):
-                    shutil.rmtree(item_path)
-            except Exception as e:
-                print(f"  [Error] Failed to delete {item_path}. Reason: {e}")
+        clear_directory(NORMALIZED_DIR)
+
+def clear_directory(path):
+    """Deletes everything inside a directory, leaving the directory itself."""
+    for item in os.listdir(path):
+        item_path = os.path.join(path, item)
+        try:
+            if os.path.isfile(item_path) or os.path.islink(item_path):
+                os.unlink(item_path)
+            elif os.path.isdir(item_path):
+                shutil.rmtree(item_path)
+        except Exception as e:
+            print(f"  [Error] Failed to delete {item_path}. Reason: {e}")
 
 
 def get_normalized_filename(dir_name):
@@ -207,10 +652,13 @@ def get_normalized_filename(dir_name):
 
 
 def process_book_task(task):
-    """Wrapper function to handle a single book processing task for the pool."""
+    """Wrapper function to handle a single book processing task for the pool.
+
+    Returns a result dict (status, timings per stage, bytes in/out, audio seconds) for the parent
+    to report and record in METRICS_FILE.
+    """
     start_time = time.time()
     dir_name = task['dir_name']
-    print(f"[Processing] Starting: {dir_name}")
 
     # Create a dedicated output folder for the book
     book_output_dir = os.path.join(NORMALIZED_DIR, dir_name)
@@ -219,42 +667,221 @@ def process_book_task(task):
 
     normalized_filename = get_normalized_filename(dir_name)
     output_filename = os.path.join(book_output_dir, normalized_filename)
+    result = {
+        "dir_name": dir_name, "status": "skipped", "output": normalized_filename, "worker": os.getpid(),
+        "bytes_in": 0, "bytes_out": 0, "audio_seconds": 0.0,
+    }
+    take_stage_times()
+
+    try:
+        fingerprint = get_book_fingerprint(task)
+    except Exception as e:
+        # A file was removed or renamed since the scan; fail this book rather than the whole run
+        print(f"[Error] Could not read the files of {dir_name}: {e}")
+        return {**result, "status": "failed", "elapsed": time.time() - start_time, "stages": take_stage_times()}
+    if INCREMENTAL and is_book_up_to_date(book_output_dir, fingerprint):
+        return {**result, "elapsed": time.time() - start_time, "stages": take_stage_times()}
+
+    print(f"[Processing] Starting: {dir_name}")
+    # Anything left here is from an older or interrupted build; ffmpeg must not find it in the way
+    clear_directory(book_output_dir)
 
     try:
+        gain_db = get_book_gain(task['audio_files']) if LOUDNESS_NORMALIZATION else None
         if len(task['audio_files']) == 1 and task['audio_files'][0].lower().endswith('.m4b'):
-            handle_single_m4b(task['audio_files'][0], task['image_file'], output_filename, dir_name)
+            handle_single_m4b(task['audio_files'][0], task['image_file'], output_filename, dir_name, gain_db)
         else:
-            handle_multiple_files(task['audio_files'], task['image_file'], output_filename, dir_name, book_output_dir)
+            image_file = prepare_cover(task['image_file']) if task['image_file'] else None
+            handle_multiple_files(task['audio_files'], image_file, output_filename, dir_name, gain_db)
     except Exception as e:
         print(f"[Error] An unexpected error occurred while processing {dir_name}: {e}")
 
+    with timed_stage("verify"):
+        status = "built" if write_book_manifest(book_output_dir, fingerprint, output_filename) else "failed"
+
     elapsed_time = time.time() - start_time
-    print(f"[Finished] Book: {dir_name} | Time: {elapsed_time:.2f}s | Output: {normalized_filename}")
-
-def handle_single_m4b(input_m4b, image_file, output_filename, title):
-    """Handles an existing M4B file, adding a cover if needed."""
-    ffprobe_cmd = ["ffprobe", "-v", "error", "-select_streams", "v:0", "-show_entries", "stream=codec_type", "-of", "csv=p=0", input_m4b]
-    result = subprocess.run(ffprobe_cmd, capture_output=True, text=True, check=False, encoding='utf-8')
-    has_cover = "video" in result.stdout
-
-    if has_cover:
-        shutil.copy(input_m4b, output_filename)
-    elif image_file:
-        ffmpeg_cmd = ["ffmpeg", "-i", input_m4b, "-i", image_file, "-map", "0:a", "-map", "1:v", "-c:a", "copy", "-c:v", "png", "-disposition:v", "attached_pic", "-metadata", f"title={title}", output_filename]
-        run_ffmpeg(ffmpeg_cmd, title)
+    result.update(
+        status=status,
+        elapsed=elapsed_time,
+        stages=take_stage_times(),
+        bytes_in=sum(entry["size"] for entry in fingerprint["audio_files"]),
+        bytes_out=os.path.getsize(output_filename) if os.path.exists(output_filename) else 0,
+        audio_seconds=sum(probe_audio_file(f)["duration"] or 0.0 for f in task['audio_files']),
+    )
+    return result
+
+def get_book_fingerprint(task):
+    """Describes everything that determines a book's output: its inputs and the ffmpeg options used."""
+    def file_entry(path):
+        stat = os.stat(path)
+        return {"path": os.path.relpath(path, ROOT_DIR), "size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+
+    return {
+        "audio_files": [file_entry(f) for f in task['audio_files']],
+        "image_file": file_entry(task['image_file']) if task['image_file'] else None,
+        "output_filename": get_normalized_filename(task['dir_name']),
+        "ffmpeg_options": {
+            "aac": get_encoding_profile(task['audio_files']),
+            "cover_max_size": COVER_MAX_SIZE,
+            "track_segments": PARALLEL_TRACK_ENCODING,
+            "loudness": [LOUDNESS_TARGET_LUFS, LOUDNESS_TOLERANCE_LU, LOUDNESS_MAX_GAIN_DB] if LOUDNESS_NORMALIZATION else None,
+        },
+    }
+
+def is_book_up_to_date(book_output_dir, fingerprint):
+    """True if the book's manifest matches the fingerprint and its recorded output is still intact."""
+    try:
+        with open(os.path.join(book_output_dir, MANIFEST_FILENAME), "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return False
+
+    if manifest.get("fingerprint") != fingerprint:
+        return False
+
+    output = manifest.get("output", {})
+    output_path = os.path.join(book_output_dir, fingerprint["output_filename"])
+    if not os.path.isfile(output_path) or os.path.getsize(output_path) != output.get("size"):
+        return False
+    return probe_audio_file(output_path)["duration"] is not None
+
+def write_book_manifest(book_output_dir, fingerprint, output_filename):
+    """Records a successfully built book, once ffprobe confirms the output is readable audio."""
+    if not os.path.isfile(output_filename):
+        return False
+    probe = probe_audio_file(output_filename)
+    if probe["duration"] is None:
+        return False
+
+    manifest = {
+        "fingerprint": fingerprint,
+        "output": {"size": os.path.getsize(output_filename), "duration": probe["duration"]},
+    }
+    manifest_path = os.path.join(book_output_dir, MANIFEST_FILENAME)
+    with open(manifest_path + ".tmp", "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(manifest_path + ".tmp", manifest_path)
+    return True
+
+def prepare_cover(image_file):
+    """Returns a JPEG/PNG cover that can be stream-copied into the M4B, or None if it is unusable.
+
+    Covers within COVER_MAX_SIZE are used untouched. Larger (or non-JPEG/PNG) images are scaled
+    down to a JPEG once and kept in COVER_CACHE_DIR, so rebuilding the book reuses it.
+    """
+    probe = probe_audio_file(image_file)
+    image = next((st for st in probe.get("streams", []) if st["codec_type"] == "video"), None)
+    if image is None:
+        print(f"  [Cover Art] Skipping unreadable cover {os.path.basename(image_file)}: {probe.get('error')}")
+        return None
+
+    width, height = image.get("width") or 0, image.get("height") or 0
+    if image["codec_name"] in ("mjpeg", "png") and max(width, height) <= COVER_MAX_SIZE:
+        return image_file
+
+    stat = os.stat(image_file)
+    cache_key = f"{os.path.abspath(image_file)}|{stat.st_size}|{stat.st_mtime_ns}|{COVER_MAX_SIZE}"
+    cached_cover = os.path.join(COVER_CACHE_DIR, hashlib.sha1(cache_key.encode("utf-8")).hexdigest() + ".jpg")
+    if os.path.exists(cached_cover):
+        return cached_cover
+
+    os.makedirs(COVER_CACHE_DIR, exist_ok=True)
+    temp_cover = f"{cached_cover}.{os.getpid()}.tmp.jpg"
+    scale = f"scale={COVER_MAX_SIZE}:{COVER_MAX_SIZE}:force_original_aspect_ratio=decrease"
+    ffmpeg_cmd = ["ffmpeg", "-i", image_file, "-vf", scale, "-frames:v", "1", "-q:v", "3", temp_cover]
+    with timed_stage("cover"):
+        if not run_ffmpeg(ffmpeg_cmd, os.path.basename(image_file)):
+            return None
+    os.replace(temp_cover, cached_cover)
+    return cached_cover
+
+def handle_single_m4b(input_m4b, image_file, output_filename, title, gain_db=None):
+    """Handles an existing M4B file, adding a cover if needed.
+
+    Whether the book already has a cover comes from the probe cache. A book that needs no cover is
+    placed with link_or_copy instead of being read and rewritten. With loudness normalization, a
+    book that is too far off target is re-encoded once with its gain (keeping its chapters).
+    """
+    has_cover = probe_audio_file(input_m4b).get("has_cover", False)
+    cover = prepare_cover(image_file) if image_file and not has_cover else None
+
+    if needs_loudness_encode(gain_db):
+        ffmpeg_cmd = ["ffmpeg", "-i", input_m4b]
+        if cover:
+            ffmpeg_cmd.extend(["-i", cover, "-map", "0:a", "-map", "1:v", "-c:v", "copy", "-disposition:v", "attached_pic"])
+        else:
+            ffmpeg_cmd.extend(["-map", "0:a", "-map", "0:v?", "-c:v", "copy"])
+        profile = get_encoding_profile([input_m4b])
+        ffmpeg_cmd.extend([*aac_encode_options(profile), *gain_filter_options(gain_db), "-metadata", f"title={title}", output_filename])
+        with encode_slot(), timed_stage("re_encode"):
+            run_ffmpeg(ffmpeg_cmd, title)
+    elif cover:
+        ffmpeg_cmd = ["ffmpeg", "-i", input_m4b, "-i", cover, "-map", "0:a", "-map", "1:v", "-c:a", "copy", "-c:v", "copy", "-disposition:v", "attached_pic", "-metadata", f"title={title}", output_filename]
+        with timed_stage("mux"):
+            run_ffmpeg(ffmpeg_cmd, title)
     else:
-        shutil.copy(input_m4b, output_filename)
+        with timed_stage("mux"):
+            method = link_or_copy(input_m4b, output_filename)
+        print(f"  [Copy] {os.path.basename(input_m4b)} placed by {method}")
+
+def link_or_copy(src, dst):
+    """Places src at dst using the cheapest method the filesystem allows, returning its name.
+
+    Tries a hardlink, then a reflink (FICLONE), then copy_file_range (which lets the kernel or a
+    NAS copy server-side), and only then a regular byte copy. The source is never moved, since it
+    must stay in the library for the next scan.
+    """
+    try:
+        os.link(src, dst)
+        return "hardlink"
+    except OSError:
+        pass
 
-def handle_multiple_files(audio_files, image_file, output_filename, title, temp_path):
-    """Concatenates multiple audio files into a single M4B, with chapters."""
-    list_filename = os.path.join(temp_path, "temp_file_list.txt")
+    try:
+        import fcntl
+        FICLONE = 0x40049409
+        with open(src, "rb") as fsrc, open(dst, "wb") as fdst:
+            fcntl.ioctl(fdst.fileno(), FICLONE, fsrc.fileno())
+        return "reflink"
+    except (ImportError, OSError):
+        pass
+
+    if hasattr(os, "copy_file_range"):
+        try:
+            with open(src, "rb") as fsrc, open(dst, "wb") as fdst:
+                remaining = os.fstat(fsrc.fileno()).st_size
+                while remaining > 0:
+                    copied = os.copy_file_range(fsrc.fileno(), fdst.fileno(), remaining)
+                    if copied == 0:
+                        break
+                    remaining -= copied
+            if remaining == 0:
+                return "copy_file_range"
+        except OSError:
+            pass
+
+    shutil.copyfile(src, dst)
+    return "copy"
+
+def handle_multiple_files(audio_files, image_file, output_filename, title, gain_db=None):
+    """Concatenates multiple audio files into a single M4B, with chapters.
+
+    `gain_db` (from get_book_gain) is applied to every track as part of the AAC encode. Intermediate
+    files live in a scratch folder under SCRATCH_DIR that is removed however the build ends.
+    """
+    with tempfile.TemporaryDirectory(prefix="normalize-audiobooks-", dir=SCRATCH_DIR) as scratch_path:
+        build_multiple_files(audio_files, image_file, output_filename, title, scratch_path, gain_db)
+
+def build_multiple_files(audio_files, image_file, output_filename, title, scratch_path, gain_db=None):
+    """Does the work of handle_multiple_files, staging intermediates in `scratch_path`."""
+    profile = get_encoding_profile(audio_files)
     temp_audio_files = []
 
     # Re-encode problematic files if necessary
-    for audio_file in audio_files:
+    for i, audio_file in enumerate(audio_files):
         if os.path.splitext(audio_file)[1].lower() == '.m4a' and get_audio_duration(audio_file) is None:
-            re_encoded_path = os.path.join(temp_path, os.path.basename(audio_file).replace('.m4a', '_reencoded.m4a'))
-            if re_encode_audio_file(audio_file, re_encoded_path, title):
+            re_encoded_path = os.path.join(scratch_path, f"{i:04d}_reencoded.m4a")
+            if re_encode_audio_file(audio_file, re_encoded_path, title, profile):
                 temp_audio_files.append(re_encoded_path)
             else:
                 # If re-encoding fails, fall back to original file (chapter will be skipped)
@@ -262,105 +889,449 @@ def handle_multiple_files(audio_files, image_file, output_filename, title, temp_
         else:
             temp_audio_files.append(audio_file)
 
-    with open(list_filename, "w", encoding="utf-8") as f:
-        for audio_file in temp_audio_files:
-            safe_path = audio_file.replace("\\", "/").replace("'", "'\\''")
-            f.write(f"file '{safe_path}'\n")
+    chapter_titles = [os.path.splitext(os.path.basename(f))[0] for f in audio_files]
+    encode_audio = not can_stream_copy(temp_audio_files, profile) or needs_loudness_encode(gain_db)
+    if encode_audio and PARALLEL_TRACK_ENCODING and len(temp_audio_files) > 1:
+        segment_files = encode_track_segments(temp_audio_files, scratch_path, title, profile, gain_db)
+        if segment_files is None:
+            print(f"  [Error] Track encoding failed for {title}; book not assembled.")
+            return
+        # Unreadable tracks got no segment; drop them and their chapter titles together
+        chapter_titles = [t for t, segment in zip(chapter_titles, segment_files) if segment]
+        temp_audio_files = [segment for segment in segment_files if segment]
+        encode_audio = False
+
+    concat_list = create_concat_list(temp_audio_files)
+    chapter_metadata = create_chapter_metadata(temp_audio_files, chapter_titles)
+
+    with text_inputs([concat_list, chapter_metadata], scratch_path) as (input_urls, pass_fds):
+        # --- FFmpeg Command Construction ---
+        # 1. Define all inputs first
+        ffmpeg_cmd = [
+            "ffmpeg",
+            "-f", "concat", "-safe", "0", "-protocol_whitelist", "file,pipe",
+            "-i", input_urls[0],                                # Input 0: Audio files list
+            "-f", "ffmetadata", "-i", input_urls[1],            # Input 1: Chapters metadata
+        ]
+        if image_file:
+            ffmpeg_cmd.extend(["-i", image_file])             # Input 2: Cover image
+
+        # 2. Map streams and metadata
+        ffmpeg_cmd.extend(["-map", "0:a"]) # Map audio from input 0
+        if image_file:
+            ffmpeg_cmd.extend(["-map_metadata", "1"]) # Map chapters from input 1
+            ffmpeg_cmd.extend(["-map", "2:v"])# Map video from input 2
+        else:
+            ffmpeg_cmd.extend(["-map_metadata", "1"])
 
-    metadata_filename = create_chapter_metadata_file(temp_audio_files, temp_path)
+        # 3. Set codecs and output options
+        if encode_audio:
+            ffmpeg_cmd.extend([*aac_encode_options(profile), *gain_filter_options(gain_db)])
+        else:
+            ffmpeg_cmd.extend(["-c:a", "copy"])
 
-    # --- FFmpeg Command Construction ---
-    # 1. Define all inputs first
-    ffmpeg_cmd = [
-        "ffmpeg",
-        "-f", "concat", "-safe", "0", "-i", list_filename,  # Input 0: Audio files list
-        "-i", metadata_filename,                          # Input 1: Chapters metadata
-    ]
-    if image_file:
-        ffmpeg_cmd.extend(["-i", image_file])             # Input 2: Cover image
-
-    # 2. Map streams and metadata
-    ffmpeg_cmd.extend(["-map", "0:a"]) # Map audio from input 0
-    if image_file:
-        ffmpeg_cmd.extend(["-map_metadata", "1"]) # Map chapters from input 1
-        ffmpeg_cmd.extend(["-map", "2:v"])# Map video from input 2
-    else:
-        ffmpeg_cmd.extend(["-map_metadata", "1"])
+        if image_file:
+            ffmpeg_cmd.extend(["-c:v", "copy", "-disposition:v", "attached_pic"])
 
-    # 3. Set codecs and output options
-    first_audio_ext = os.path.splitext(temp_audio_files[0])[1].lower()
-    if first_audio_ext == '.mp3':
-        ffmpeg_cmd.extend(["-c:a", "aac", "-b:a", "128k"])
-    else:
-        ffmpeg_cmd.extend(["-c:a", "copy"])
+        ffmpeg_cmd.extend(["-metadata", f"title={title}", output_filename])
 
-    if image_file:
-        ffmpeg_cmd.extend(["-c:v", "png", "-disposition:v", "attached_pic"])
+        if encode_audio:
+            with encode_slot(), timed_stage("re_encode"):
+                run_ffmpeg(ffmpeg_cmd, title, pass_fds)
+        else:
+            with timed_stage("concat"):
+                run_ffmpeg(ffmpeg_cmd, title, pass_fds)
 
-    ffmpeg_cmd.extend(["-metadata", f"title={title}", output_filename])
-    
-    run_ffmpeg(ffmpeg_cmd, title)
+def create_concat_list(audio_files):
+    """Builds an ffmpeg concat demuxer script for the audio files.
 
-    # --- Cleanup ---
+    Paths are given as absolute file: URLs so they resolve the same whether the script is read
+    from a pipe or a file.
+    """
+    lines = []
+    for audio_file in audio_files:
+        safe_path = os.path.abspath(audio_file).replace("\\", "/").replace("'", "'\\''")
+        lines.append(f"file 'file:{safe_path}'\n")
+    return "".join(lines)
+
+@contextlib.contextmanager
+def text_inputs(texts, scratch_path):
+    """Makes each text readable by an ffmpeg child process; yields (input URLs, fds to pass on).
+
+    On POSIX every text is fed through its own pipe (pipe:N) by a writer thread, so nothing touches
+    the disk. Elsewhere the texts are written to small files in `scratch_path`.
+    """
+    if os.name != "posix":
+        paths = []
+        for i, text in enumerate(texts):
+            path = os.path.join(scratch_path, f"input_{i}.txt")
+            with open(path, "w", encoding="utf-8") as f:
+                f.write(text)
+            paths.append(path)
+        yield paths, ()
+        return
+
+    pipes = [os.pipe() for _ in texts]
+    writers = [
+        threading.Thread(target=write_pipe, args=(write_fd, text.encode("utf-8")), daemon=True)
+        for (_, write_fd), text in zip(pipes, texts)
+    ]
+    for writer in writers:
+        writer.start()
     try:
-        os.remove(list_filename)
-        os.remove(metadata_filename)
-        for f in temp_audio_files:
-            if "_reencoded.m4a" in f:
-                os.remove(f)
-    except OSError:
+        yield [f"pipe:{read_fd}" for read_fd, _ in pipes], tuple(read_fd for read_fd, _ in pipes)
+    finally:
+        # Once our read ends are closed too, a writer whose reader never showed up gets EPIPE and stops
+        for read_fd, _ in pipes:
+            os.close(read_fd)
+        for writer in writers:
+            writer.join()
+
+def write_pipe(fd, data):
+    """Writes all of `data` to a pipe and closes it; a reader that went away is not an error."""
+    try:
+        with open(fd, "wb") as f:
+            f.write(data)
+    except BrokenPipeError:
         pass
 
-def create_chapter_metadata_file(audio_files, temp_path):
-    """Generates a metadata file with chapter markers for each audio file."""
-    metadata_filename = os.path.join(temp_path, "chapters_metadata.txt")
+def encode_track_segments(audio_files, scratch_path, title, profile, gain_db=None):
+    """Encodes each track to its own AAC segment in parallel, ready to be stream-copy concatenated.
+
+    Tracks that are already AAC in the profile's format are copied into their segment instead
+    (unless a gain has to be applied). Tracks that can't be probed are skipped, just as chapter
+    building skips them, and get None in place of a segment. Returns the segment paths in track
+    order, or None if a readable track failed to encode (or none are readable). The segments are
+    left in `scratch_path` for the caller to clean up.
+    """
+    segment_dir = os.path.join(scratch_path, "segments")
+    os.makedirs(segment_dir, exist_ok=True)
+    segment_files = [os.path.join(segment_dir, f"{i:04d}.m4a") for i in range(len(audio_files))]
+
+    def encode(args):
+        input_file, segment_file = args
+        if probe_audio_file(input_file)["duration"] is None:
+            print(f"  [Skip] {os.path.basename(input_file)} is unreadable; leaving it out of {title}")
+            return None
+        if not gain_db and get_aac_format(input_file) == profile_format(profile):
+            with timed_stage("concat"):
+                return run_ffmpeg(["ffmpeg", "-i", input_file, "-map", "0:a", "-c:a", "copy", segment_file], title)
+        ffmpeg_cmd = ["ffmpeg", "-i", input_file, "-map", "0:a", *aac_encode_options(profile), *gain_filter_options(gain_db), segment_file]
+        with encode_slot(), timed_stage("re_encode"):
+            return run_ffmpeg(ffmpeg_cmd, title)
+
+    # The shared encode slots, not this thread count, decide how many tracks actually run at once
+    with ThreadPoolExecutor(max_workers=ENCODE_SLOTS) as executor:
+        results = list(executor.map(encode, zip(audio_files, segment_files)))
+
+    if False in results or not any(results):
+        return None
+    return [segment if ok else None for segment, ok in zip(segment_files, results)]
+
+def get_encoding_profile(audio_files):
+    """Picks the AAC settings for a book from its tracks' probe data.
+
+    Never more channels (stereo at most, mono with AAC_DOWNMIX_MONO), a higher sample rate or a
+    higher bitrate than the source, so a 48k mono MP3 stays a small mono file. Unreadable tracks
+    don't count; a book with no readable tracks gets 44.1 kHz stereo at the bitrate cap.
+    """
+    probes = [probe_audio_file(f) for f in audio_files]
+    probes = [p for p in probes if p["duration"] is not None]
+
+    channels = min(2, max((p.get("channels") or 2 for p in probes), default=2))
+    if AAC_DOWNMIX_MONO:
+        channels = 1
+    source_rate = max((p.get("sample_rate") or 44100 for p in probes), default=44100)
+    sample_rate = next((rate for rate in AAC_SAMPLE_RATES if rate >= source_rate), AAC_SAMPLE_RATES[-1])
+    bitrate = AAC_MAX_BITRATE_PER_CHANNEL * channels
+    source_bitrates = [p.get("bit_rate") for p in probes]
+    if source_bitrates and all(source_bitrates):
+        bitrate = min(bitrate, max(source_bitrates))
+    bitrate = max(AAC_MIN_BITRATE, bitrate // 1000 * 1000)
+
+    he_aac = (
+        HE_AAC and bitrate <= HE_AAC_MAX_BITRATE_PER_CHANNEL * channels and sample_rate >= 22050
+        and has_ffmpeg_encoder("libfdk_aac")
+    )
+    return {
+        "encoder": "libfdk_aac" if he_aac else "aac",
+        "profile": "HE-AAC" if he_aac else "LC",
+        "bitrate": bitrate,
+        "channels": channels,
+        "sample_rate": sample_rate,
+    }
+
+def aac_encode_options(profile):
+    """ffmpeg output options for an encoding profile from get_encoding_profile."""
+    options = ["-c:a", profile["encoder"]]
+    if profile["profile"] == "HE-AAC":
+        options.extend(["-profile:a", "aac_he"])
+    return options + ["-b:a", f"{profile['bitrate'] // 1000}k", "-ac", str(profile["channels"]), "-ar", str(profile["sample_rate"])]
+
+def get_aac_format(file_path):
+    """(AAC profile, channels, sample rate) of an AAC file, or None for anything else."""
+    probe = probe_audio_file(file_path)
+    if probe["duration"] is None or probe.get("codec") != "aac":
+        return None
+    return (probe.get("profile"), probe.get("channels"), probe.get("sample_rate"))
+
+def profile_format(profile):
+    """The get_aac_format tuple a file encoded with `profile` has."""
+    return (profile["profile"], profile["channels"], profile["sample_rate"])
+
+def can_stream_copy(audio_files, profile):
+    """True if every track is AAC in one shared format, so the book can be concatenated as-is.
+
+    The source's own profile, bitrate and sample rate are kept; only more channels than the
+    encoding profile allows (e.g. stereo with AAC_DOWNMIX_MONO) forces an encode. Unreadable
+    tracks are left out of the check, as they are left out of the chapters.
+    """
+    formats = {get_aac_format(f) for f in audio_files if probe_audio_file(f)["duration"] is not None}
+    if len(formats) != 1 or None in formats:
+        return False
+    channels = next(iter(formats))[1]
+    return channels is not None and channels <= profile["channels"]
+
+_ffmpeg_encoders = None
+
+def has_ffmpeg_encoder(name):
+    """True if the installed ffmpeg lists `name` among its encoders (checked once per process)."""
+    global _ffmpeg_encoders
+    if _ffmpeg_encoders is None:
+        try:
+            result = subprocess.run(["ffmpeg", "-hide_banner", "-encoders"], capture_output=True, text=True, encoding='utf-8')
+            _ffmpeg_encoders = set(re.findall(r"^\s*A\S*\s+(\S+)", result.stdout, re.MULTILINE))
+        except FileNotFoundError:
+            _ffmpeg_encoders = set()
+    return name in _ffmpeg_encoders
+
+def get_book_gain(audio_files):
+    """Returns the gain in dB that brings a book to LOUDNESS_TARGET_LUFS, or None if it can't be measured.
+
+    Tracks are measured in parallel (each measurement is an ffmpeg decode, so it holds an encode
+    slot) and the book's loudness is their duration-weighted energy average.
+    """
+    with ThreadPoolExecutor(max_workers=ENCODE_SLOTS) as executor:
+        loudness = list(executor.map(measure_loudness, audio_files))
+
+    energy, total_duration = 0.0, 0.0
+    for audio_file, lufs in zip(audio_files, loudness):
+        duration = probe_audio_file(audio_file)["duration"]
+        if lufs is None or not duration:
+            continue
+        energy += duration * 10 ** (lufs / 10)
+        total_duration += duration
+    if not energy:
+        return None
+
+    book_lufs = 10 * math.log10(energy / total_duration)
+    gain_db = max(-LOUDNESS_MAX_GAIN_DB, min(LOUDNESS_MAX_GAIN_DB, LOUDNESS_TARGET_LUFS - book_lufs))
+    print(f"  [Loudness] Book measures {book_lufs:.1f} LUFS, applying {gain_db:+.1f} dB")
+    return gain_db
+
+def measure_loudness(file_path):
+    """Integrated loudness of a file in LUFS (EBU R128), cached alongside its probe data."""
+    path = os.path.abspath(file_path)
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    try:
+        conn = get_probe_cache()
+        row = conn.execute("SELECT size, mtime_ns, lufs FROM loudness WHERE path = ?", (path,)).fetchone()
+        if row and row[0] == stat.st_size and row[1] == stat.st_mtime_ns:
+            return row[2]
+    except sqlite3.Error as e:
+        print(f"  [Warning] Probe cache unavailable ({e}), measuring {os.path.basename(path)} directly.")
+        conn = None
+
+    ffmpeg_cmd = ["ffmpeg", "-hide_banner", "-nostats", "-i", path, "-map", "0:a", "-af", "ebur128=framelog=quiet", "-f", "null", "-"]
+    with encode_slot(), timed_stage("loudness"):
+        result = subprocess.run(ffmpeg_cmd, capture_output=True, text=True, encoding='utf-8', errors='replace')
+    matches = re.findall(r"Integrated loudness:\s*I:\s*(-?[\d.]+) LUFS", result.stderr)
+    lufs = float(matches[-1]) if matches else None
+
+    if conn is not None:
+        try:
+            with conn:
+                conn.execute(
+                    "INSERT OR REPLACE INTO loudness (path, size, mtime_ns, lufs) VALUES (?, ?, ?, ?)",
+                    (path, stat.st_size, stat.st_mtime_ns, lufs),
+                )
+        except sqlite3.Error as e:
+            print(f"  [Warning] Could not update probe cache for {os.path.basename(path)}: {e}")
+    return lufs
+
+def needs_loudness_encode(gain_db):
+    """True if a book that would otherwise be stream-copied is far enough off target to re-encode."""
+    return gain_db is not None and abs(gain_db) > LOUDNESS_TOLERANCE_LU
+
+def gain_filter_options(gain_db):
+    """ffmpeg options applying a book's gain during an encode (none if there is no gain)."""
+    return ["-af", f"volume={gain_db:.2f}dB"] if gain_db else []
+
+def create_chapter_metadata(audio_files, chapter_titles=None):
+    """Builds FFMETADATA text with a chapter marker for each audio file.
+
+    Chapters are named after the files unless `chapter_titles` gives a name for each one.
+    """
+    lines = [";FFMETADATA1\n"]
     total_duration_ms = 0
-    with open(metadata_filename, "w", encoding="utf-8") as f:
-        f.write(";FFMETADATA1\n")
-        for i, audio_file in enumerate(audio_files):
-            duration_s = get_audio_duration(audio_file)
-            if duration_s is None:
-                continue
-
-            start_time = total_duration_ms
-            end_time = total_duration_ms + int(duration_s * 1000)
+    for i, audio_file in enumerate(audio_files):
+        duration_s = get_audio_duration(audio_file)
+        if duration_s is None:
+            continue
+
+        start_time = total_duration_ms
+        end_time = total_duration_ms + int(duration_s * 1000)
+        if chapter_titles:
+            chapter_title = chapter_titles[i]
+        else:
             chapter_title = os.path.splitext(os.path.basename(audio_file))[0]
 
-            f.write("[CHAPTER]\n")
-            f.write("TIMEBASE=1/1000\n")
-            f.write(f"START={start_time}\n")
-            f.write(f"END={end_time}\n")
-            f.write(f"title={chapter_title}\n")
+        lines.append("[CHAPTER]\n")
+        lines.append("TIMEBASE=1/1000\n")
+        lines.append(f"START={start_time}\n")
+        lines.append(f"END={end_time}\n")
+        lines.append(f"title={chapter_title}\n")
 
-            total_duration_ms = end_time
-    return metadata_filename
+        total_duration_ms = end_time
+    return "".join(lines)
 
 def get_audio_duration(file_path):
-    """Gets the duration of an audio file in seconds using ffprobe."""
-    ffprobe_cmd = [
-        "ffprobe", "-v", "error", "-show_entries", "format=duration",
-        "-of", "default=noprint_wrappers=1:nokey=1", file_path
-    ]
+    """Gets the duration of an audio file in seconds, using the probe cache where possible."""
+    probe = probe_audio_file(file_path)
+    if probe["duration"] is None:
+        print(f"  [Warning] Could not get duration for {os.path.basename(file_path)}. Chapter will be skipped. Error: {probe['error']}")
+    return probe["duration"]
+
+_probe_cache = threading.local()
+
+def get_probe_cache():
+    """Opens the SQLite probe cache once per thread (connections can't be shared across threads or a fork).
+
+    Besides ffprobe results it holds loudness measurements and the Open Library lookups
+    (title -> ISBN -> cover file).
+    """
+    if getattr(_probe_cache, "key", None) != (os.getpid(), PROBE_CACHE_FILE):
+        _probe_cache.conn = sqlite3.connect(PROBE_CACHE_FILE, timeout=30)
+        _probe_cache.conn.execute("PRAGMA journal_mode=WAL")
+        _probe_cache.conn.execute(
+            "CREATE TABLE IF NOT EXISTS probes (path TEXT PRIMARY KEY, size INTEGER, mtime_ns INTEGER, info TEXT)"
+        )
+        _probe_cache.conn.execute(
+            "CREATE TABLE IF NOT EXISTS loudness (path TEXT PRIMARY KEY, size INTEGER, mtime_ns INTEGER, lufs REAL)"
+        )
+        # title -> ISBN and ISBN -> cached image path; a NULL value records a miss
+        for table in ("cover_isbns", "cover_images"):
+            _probe_cache.conn.execute(
+                f"CREATE TABLE IF NOT EXISTS {table} (key TEXT PRIMARY KEY, value TEXT, checked_at REAL)"
+            )
+        _probe_cache.key = (os.getpid(), PROBE_CACHE_FILE)
+    return _probe_cache.conn
+
+def probe_audio_file(file_path):
+    """Returns ffprobe details for an audio file, keyed on (path, size, mtime_ns).
+
+    The file is only probed when it is new or has changed since it was last seen; failed probes
+    are cached too, so a broken file is not re-probed on every lookup.
+    """
+    path = os.path.abspath(file_path)
+    try:
+        stat = os.stat(path)
+    except OSError as e:
+        return {"duration": None, "error": str(e)}
+
+    try:
+        conn = get_probe_cache()
+        row = conn.execute("SELECT size, mtime_ns, info FROM probes WHERE path = ?", (path,)).fetchone()
+        if row and row[0] == stat.st_size and row[1] == stat.st_mtime_ns:
+            info = json.loads(row[2])
+            if info.get("version") == PROBE_CACHE_VERSION:
+                return info
+    except sqlite3.Error as e:
+        print(f"  [Warning] Probe cache unavailable ({e}), probing {os.path.basename(path)} directly.")
+        conn = None
+
+    ffprobe_cmd = ["ffprobe", "-v", "error", "-show_format", "-show_streams", "-of", "json", path]
     try:
-        result = subprocess.run(ffprobe_cmd, capture_output=True, text=True, check=True, encoding='utf-8')
-        return float(result.stdout)
+        with timed_stage("probe"):
+            result = subprocess.run(ffprobe_cmd, capture_output=True, text=True, check=True, encoding='utf-8')
+        info = parse_probe_output(result.stdout)
     except subprocess.CalledProcessError as e:
-        error_message = e.stderr.strip().splitlines()[-1] if e.stderr else str(e)
-        print(f"  [Warning] Could not get duration for {os.path.basename(file_path)}. Chapter will be skipped. Error: {error_message}")
-        return None
-    except (FileNotFoundError, ValueError) as e:
-        print(f"  [Warning] Could not get duration for {os.path.basename(file_path)}. Chapter will be skipped. Error: {e}")
-        return None
+        error_message = e.stderr.strip().splitlines()[-1] if e.stderr and e.stderr.strip() else str(e)
+        info = {"duration": None, "error": error_message}
+    except FileNotFoundError as e:
+        # ffprobe itself is missing; that says nothing about the file, so don't cache it
+        return {"duration": None, "error": str(e)}
+
+    info["version"] = PROBE_CACHE_VERSION
+    if conn is not None:
+        try:
+            with conn:
+                conn.execute(
+                    "INSERT OR REPLACE INTO probes (path, size, mtime_ns, info) VALUES (?, ?, ?, ?)",
+                    (path, stat.st_size, stat.st_mtime_ns, json.dumps(info)),
+                )
+        except sqlite3.Error as e:
+            print(f"  [Warning] Could not update probe cache for {os.path.basename(path)}: {e}")
+    return info
+
+def parse_probe_output(output):
+    """Condenses `ffprobe -show_format -show_streams -of json` output into the fields we use."""
+    try:
+        data = json.loads(output)
+    except ValueError as e:
+        return {"duration": None, "error": f"Unreadable ffprobe output: {e}"}
+
+    fmt = data.get("format", {})
+    streams = [
+        {
+            "index": s.get("index"),
+            "codec_type": s.get("codec_type"),
+            "codec_name": s.get("codec_name"),
+            "channels": s.get("channels"),
+            "channel_layout": s.get("channel_layout"),
+            "width": s.get("width"),
+            "height": s.get("height"),
+            "attached_pic": bool(s.get("disposition", {}).get("attached_pic")),
+        }
+        for s in data.get("streams", [])
+    ]
+    audio = next((s for s in data.get("streams", []) if s.get("codec_type") == "audio"), {})
+
+    def to_number(value, kind):
+        try:
+            return kind(value)
+        except (TypeError, ValueError):
+            return None
 
-def re_encode_audio_file(input_file, output_path, title):
-    """Re-encodes an audio file to AAC format."""
+    duration = to_number(fmt.get("duration"), float)
+    return {
+        "duration": duration,
+        "error": None if duration is not None else "No duration reported by ffprobe",
+        "format_name": fmt.get("format_name"),
+        "size": to_number(fmt.get("size"), int),
+        "codec": audio.get("codec_name"),
+        "profile": audio.get("profile"),
+        "sample_rate": to_number(audio.get("sample_rate"), int),
+        "bit_rate": to_number(audio.get("bit_rate"), int) or to_number(fmt.get("bit_rate"), int),
+        "channels": audio.get("channels"),
+        "channel_layout": audio.get("channel_layout"),
+        "streams": streams,
+        "has_cover": any(s["codec_type"] == "video" for s in streams),
+    }
+
+def re_encode_audio_file(input_file, output_path, title, profile):
+    """Re-encodes an audio file to AAC format, using the book's encoding profile."""
     print(f"  [Re-encode] Re-encoding {os.path.basename(input_file)} for {title}")
     ffmpeg_cmd = [
-        "ffmpeg", "-i", input_file, "-c:a", "aac", "-b:a", "128k",
+        "ffmpeg", "-i", input_file, *aac_encode_options(profile),
         output_path
     ]
     try:
-        subprocess.run(ffmpeg_cmd, check=True, capture_output=True, text=True, encoding='utf-8')
+        with encode_slot(), timed_stage("re_encode"):
+            subprocess.run(ffmpeg_cmd, check=True, capture_output=True, text=True, encoding='utf-8')
         print(f"  [Re-encode] Successfully re-encoded {os.path.basename(input_file)}")
         return True
     except subprocess.CalledProcessError as e:
@@ -373,69 +1344,140 @@ def re_encode_audio_file(input_file, output_path, title):
 
 
 
-def run_ffmpeg(command, title):
-    """Executes an FFmpeg command and prints success or failure."""
+def run_ffmpeg(command, title, pass_fds=()):
+    """Executes an FFmpeg command and prints success or failure. Returns True on success.
+
+    `pass_fds` keeps extra descriptors (such as text_inputs pipes) open in the child.
+    """
     try:
-        subprocess.run(command, check=True, capture_output=True, text=True, encoding='utf-8')
+        subprocess.run(command, check=True, capture_output=True, text=True, encoding='utf-8', pass_fds=pass_fds)
+        return True
     except subprocess.CalledProcessError as e:
         stderr_lines = e.stderr.splitlines()
         print(f"  [FFmpeg Error] Failed on book: {title}\n    => Command: {' '.join(command)}\n    => Details: {" ".join(stderr_lines[-5:])}")
     except FileNotFoundError:
         print("  [Critical Error] ffmpeg command not found. Please ensure FFmpeg is installed and in your system's PATH.")
+    return False
+
+_cover_session = None
+_cover_session_lock = threading.Lock()
+_cover_lookup_slots = threading.BoundedSemaphore(COVER_LOOKUP_WORKERS)
+
+def get_cover_session():
+    """Returns the shared keep-alive session for Open Library, with retry and backoff on transient errors."""
+    global _cover_session
+    with _cover_session_lock:
+        if _cover_session is None:
+            retry = Retry(
+                total=COVER_LOOKUP_RETRIES, backoff_factor=0.5,
+                status_forcelist=[429, 500, 502, 503, 504], allowed_methods=["GET"],
+            )
+            adapter = HTTPAdapter(pool_connections=2, pool_maxsize=COVER_LOOKUP_WORKERS, max_retries=retry)
+            _cover_session = requests.Session()
+            _cover_session.mount("http://", adapter)
+            _cover_session.mount("https://", adapter)
+        return _cover_session
+
+def cover_lookup_get(url, params):
+    """GETs from Open Library, holding one of the COVER_LOOKUP_WORKERS request slots."""
+    with _cover_lookup_slots:
+        return get_cover_session().get(url, params=params, timeout=COVER_LOOKUP_TIMEOUT)
+
+def get_cached_cover_lookup(table, key):
+    """Returns (found, value) from a cover lookup table; stale negative entries count as not found."""
+    row = get_probe_cache().execute(f"SELECT value, checked_at FROM {table} WHERE key = ?", (key,)).fetchone()
+    if row is None:
+        return False, None
+    value, checked_at = row
+    if value is None and not COVER_LOOKUP_OFFLINE:
+        if time.time() - checked_at > COVER_LOOKUP_NEGATIVE_TTL_DAYS * 86400:
+            return False, None
+    if table == "cover_images" and value is not None and not os.path.exists(value):
+        return False, None
+    return True, value
+
+def store_cover_lookup(table, key, value):
+    """Records a positive (value) or negative (None) cover lookup result."""
+    conn = get_probe_cache()
+    with conn:
+        conn.execute(f"INSERT OR REPLACE INTO {table} VALUES (?, ?, ?)", (key, value, time.time()))
+
+def find_isbn(book_title):
+    """Searches Open Library for a book title and returns the best ISBN, or None."""
+    found, isbn = get_cached_cover_lookup("cover_isbns", book_title)
+    if found or COVER_LOOKUP_OFFLINE:
+        return isbn
+
+    # 1. Search Open Library for the book
+    response = cover_lookup_get(OPEN_LIBRARY_SEARCH_URL, params={"title": book_title, "fields": "*,isbn,cover_i"})
+    response.raise_for_status()
+    docs = response.json().get('docs', [])
+
+    # 2. Prioritize entries that have both an ISBN and a cover ID, else take the first available ISBN
+    isbn = next((doc['isbn'][0] for doc in docs if doc.get('isbn') and doc.get('cover_i')), None)
+    if not isbn:
+        isbn = next((doc['isbn'][0] for doc in docs if doc.get('isbn')), None)
+
+    store_cover_lookup("cover_isbns", book_title, isbn)
+    return isbn
+
+def fetch_cover_image(isbn):
+    """Returns a locally cached cover image for an ISBN, downloading it on first use."""
+    found, image_file = get_cached_cover_lookup("cover_images", isbn)
+    if found or COVER_LOOKUP_OFFLINE:
+        return image_file
+
+    # 3. Fetch the cover using the ISBN (default=false turns "no cover" into a 404 instead of a blank image)
+    cover_url = OPEN_LIBRARY_COVER_URL.format(isbn=isbn)
+    print(f"  [Cover Art] Downloading from: {cover_url}")
+    response = cover_lookup_get(cover_url, params={"default": "false"})
+    if response.status_code == 404:
+        store_cover_lookup("cover_images", isbn, None)
+        return None
+    response.raise_for_status()
+
+    # Check if a valid image was returned
+    if 'image' not in response.headers.get('content-type', ''):
+        store_cover_lookup("cover_images", isbn, None)
+        return None
+
+    os.makedirs(COVER_CACHE_DIR, exist_ok=True)
+    image_file = os.path.join(COVER_CACHE_DIR, f"isbn-{isbn}.jpg")
+    temp_file = f"{image_file}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(temp_file, 'wb') as f:
+        f.write(response.content)
+    os.replace(temp_file, image_file)
+    store_cover_lookup("cover_images", isbn, image_file)
+    return image_file
 
 def download_cover_art(book_title, download_path):
-    """Searches for and downloads cover art for a given book title using the Open Library API."""
-    print(f"  [Cover Art] Searching for cover for: {book_title}")
-    try:
-        # 1. Search Open Library for the book
-        search_url = f"http://openlibrary.org/search.json?title={requests.utils.quote(book_title)}&fields=*,isbn,cover_i"
-        response = requests.get(search_url)
-        response.raise_for_status()
-        search_results = response.json()
-
-        if not search_results.get('docs'):
-            print(f"  [Cover Art] No search results found for: {book_title}")
-            return None
+    """Finds cover art for a book title via Open Library and saves it as cover.jpg in download_path.
 
-        # 2. Find a valid ISBN for the book
-        isbn = None
-        # Iterate through the top search results to find a valid ISBN
-        for doc in search_results.get('docs', []):
-            # Prioritize entries that have both an ISBN and a cover ID
-            if doc.get('isbn') and doc.get('cover_i'):
-                isbn = doc['isbn'][0]
-                break
-        
-        # If no ideal match is found, take the first available ISBN
-        if not isbn:
-            for doc in search_results.get('docs', []):
-                if doc.get('isbn'):
-                    isbn = doc['isbn'][0]
-                    break
+    Both steps (title -> ISBN, ISBN -> image) are cached in the probe cache, including misses, so
+    reruns don't query Open Library again; with COVER_LOOKUP_OFFLINE only the cache is consulted.
+    """
+    print(f"  [Cover Art] Searching for cover for: {book_title}")
+    with timed_stage("cover_fetch"):
+        return fetch_book_cover(book_title, download_path)
 
+def fetch_book_cover(book_title, download_path):
+    """The body of download_cover_art; kept separate so the whole lookup is timed as one stage."""
+    try:
+        isbn = find_isbn(book_title)
         if not isbn:
             print(f"  [Cover Art] No ISBN found for: {book_title}")
             return None
 
-        # 3. Fetch the cover using the ISBN
-        cover_url = f"http://covers.openlibrary.org/b/isbn/{isbn}-L.jpg"
-        print(f"  [Cover Art] Downloading from: {cover_url}")
-        response = requests.get(cover_url, stream=True)
-        response.raise_for_status()
-
-        # Check if a valid image was returned
-        if 'content-type' in response.headers and 'image' in response.headers['content-type']:
-            # Save the image
-            image_filename = os.path.join(download_path, "cover.jpg")
-            with open(image_filename, 'wb') as f:
-                for chunk in response.iter_content(chunk_size=8192):
-                    f.write(chunk)
-            print(f"  [Cover Art] Successfully downloaded cover to: {image_filename}")
-            return image_filename
-        else:
+        cached_image = fetch_cover_image(isbn)
+        if not cached_image:
             print(f"  [Cover Art] No cover image found for ISBN: {isbn}")
             return None
 
+        image_filename = os.path.join(download_path, "cover.jpg")
+        shutil.copyfile(cached_image, image_filename)
+        print(f"  [Cover Art] Successfully downloaded cover to: {image_filename}")
+        return image_filename
+
     except requests.exceptions.RequestException as e:
         print(f"  [Cover Art] An error occurred while communicating with Open Library for {book_title}: {e}")
         return None
@@ -1,20 +1,225 @@
+import argparse
+import asyncio
+import json
+import os
+import random
+import time
 
 import requests
-import json
 
-def fetch_sessions():
-    s = requests.Session()
-    s.headers.update({
-        'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/114.0.0.0 Safari/537.36'
-    })
+from jsonl_reader import read_records
+
+BASE_URL = 'https://aws.amazon.com/api/dirs/items/search'
+DIRECTORY_ID = 'events-cards-interactive-emea-event-agenda'
+LOCALE = 'en_US'
+EVENT_TAG_PREFIX = 'GLOBAL#local-tags-emea-event-agenda-event-name#'
+DEFAULT_EVENT = 'summit-johannesburg-2025'
+# Largest page we ask for; if the API caps it lower, the size of the first page is used instead
+PAGE_SIZE = 100
+# Pages fetched at once after the first
+CONCURRENCY = 4
+RETRIES = 4
+TIMEOUT = 30
+# Per-event dateUpdated watermarks for --incremental
+STATE_FILE = 'sync_state.json'
+USER_AGENT = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/114.0.0.0 Safari/537.36'
+
+
+def event_tag(event):
+    """Accepts a bare event name (summit-johannesburg-2025) or a full tag id."""
+    return event if '#' in event else EVENT_TAG_PREFIX + event
+
+
+def search_params(args, page, size, sort_by='item.dateCreated', sort_order='asc'):
+    return {
+        'item.directoryId': args.directory_id,
+        'item.locale': args.locale,
+        'tags.id': event_tag(args.event),
+        'sort_by': sort_by,
+        'sort_order': sort_order,
+        'size': size,
+        'page': page,
+    }
+
+
+def get_page(session, args, page, size, sort_by='item.dateCreated', sort_order='asc'):
+    """GETs one page, retrying with exponential backoff on network errors, 429 and 5xx."""
+    params = search_params(args, page, size, sort_by, sort_order)
+    for attempt in range(args.retries + 1):
+        try:
+            response = session.get(args.base_url, params=params, timeout=TIMEOUT)
+            if response.status_code != 429 and response.status_code < 500:
+                response.raise_for_status()
+                return response.json()
+            error = f'HTTP {response.status_code}'
+        except (requests.ConnectionError, requests.Timeout) as e:
+            error = str(e)
+        if attempt == args.retries:
+            raise RuntimeError(f'page {page} failed after {args.retries + 1} attempts: {error}')
+        delay = 0.5 * 2 ** attempt + random.uniform(0, 0.5)
+        print(f'Page {page}: {error}, retrying in {delay:.1f}s')
+        time.sleep(delay)
+
+
+def new_session(args):
+    session = requests.Session()
+    session.headers.update({'User-Agent': USER_AGENT, 'Accept': 'application/json'})
+    adapter = requests.adapters.HTTPAdapter(pool_maxsize=args.concurrency)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
+
+
+async def fetch_items(args):
+    """Fetches every item for the event: the first page gives the total, the rest are fetched concurrently."""
+    session = new_session(args)
+    first = await asyncio.to_thread(get_page, session, args, 0, args.page_size)
+    items = first.get('items', [])
+    total = first.get('metadata', {}).get('totalHits', len(items))
+    # The API may quietly return fewer items than asked for; page by what it actually gave us
+    page_size = args.page_size
+    if 0 < len(items) < min(page_size, total):
+        page_size = len(items)
+    pages = -(-total // page_size) if page_size else 1
+    print(f'{total} items in {pages} pages of {page_size}')
+
+    slots = asyncio.Semaphore(args.concurrency)
+
+    async def fetch(page):
+        async with slots:
+            data = await asyncio.to_thread(get_page, session, args, page, page_size)
+            return data.get('items', [])
+
+    for page_items in await asyncio.gather(*(fetch(page) for page in range(1, pages))):
+        items.extend(page_items)
+    return items
+
+
+def fetch_updated_items(args, watermark):
+    """Fetches items updated at or after `watermark`, most recently updated first.
+
+    Pages are read one at a time and paging stops at the first item older than the watermark,
+    so a quiet agenda costs a single request. Items updated exactly at the watermark are fetched
+    again; upserting them is harmless.
+    """
+    session = new_session(args)
+    items = []
+    page = 0
+    while True:
+        data = get_page(session, args, page, args.page_size, 'item.dateUpdated', 'desc')
+        page_items = data.get('items', [])
+        # dateUpdated is always UTC in the same format (2025-08-12T13:14:05+0000), so strings compare in time order
+        fresh = [item for item in page_items if item['item'].get('dateUpdated', '') >= watermark]
+        items.extend(fresh)
+        total = data.get('metadata', {}).get('totalHits', 0)
+        page += 1
+        if len(fresh) < len(page_items) or not page_items or page * len(page_items) >= total:
+            return items
+
+
+def read_items(path):
+    items = {}
+    if os.path.exists(path):
+        for item in read_records([path]):
+            try:
+                items[item['item']['id']] = item
+            except (KeyError, TypeError):
+                continue
+    return items
+
+
+def load_state(path):
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        return json.load(f)
+
+
+def output_stamp(path):
+    """Size and mtime of an output file, to tell whether anything rewrote it since our last sync."""
+    if not os.path.exists(path):
+        return None
+    stat = os.stat(path)
+    return [stat.st_size, stat.st_mtime_ns]
+
+
+def save_state(state, path):
+    temp_path = path + '.tmp'
+    with open(temp_path, 'w') as f:
+        json.dump(state, f, indent=2)
+    os.replace(temp_path, path)
+
+
+def write_items(items, path):
+    """Writes items in stable dateCreated order (then id), dropping duplicates from shifting pages."""
+    unique = {item['item']['id']: item for item in items}
+    ordered = sorted(unique.values(), key=lambda i: (i['item'].get('dateCreated', ''), i['item']['id']))
+    temp_path = path + '.tmp'
+    with open(temp_path, 'w') as f:
+        for item in ordered:
+            f.write(json.dumps(item) + '\n')
+    os.replace(temp_path, path)
+    return len(ordered)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Download an AWS event agenda to JSONL.')
+    parser.add_argument('--event', default=DEFAULT_EVENT, help='event name tag, e.g. summit-stockholm-2025 (or a full tags.id)')
+    parser.add_argument('--directory-id', default=DIRECTORY_ID, help='item.directoryId of the agenda')
+    parser.add_argument('--locale', default=LOCALE)
+    parser.add_argument('--base-url', default=BASE_URL, help='search endpoint (point at a mock server for testing)')
+    parser.add_argument('--page-size', type=int, default=PAGE_SIZE)
+    parser.add_argument('--concurrency', type=int, default=CONCURRENCY)
+    parser.add_argument('--retries', type=int, default=RETRIES)
+    parser.add_argument('-o', '--output', default='sessions.jsonl')
+    parser.add_argument('--incremental', action='store_true', help='only fetch items updated since the last sync and upsert them')
+    parser.add_argument('--delta', help='where to write the new and changed items (default: <output>.delta.jsonl)')
+    parser.add_argument('--state', default=STATE_FILE, help='file holding the per-event watermarks')
+    return parser.parse_args()
+
+
+def fetch_sessions(args):
+    """Syncs one event into args.output and writes what changed to the delta file.
+
+    An incremental run only builds on args.output if that file is exactly as the last sync of this
+    event left it; if another event or tool rewrote it, the event is fetched in full instead.
+    Incremental runs can't see deleted sessions; run without --incremental now and then to drop them.
+    """
+    state = load_state(args.state)
+    output = os.path.abspath(args.output)
+    key = f'{args.directory_id}|{event_tag(args.event)}|{output}'
+    entry = state.get(key, {})
+    watermark = entry.get('watermark')
+    existing = read_items(args.output)
+
+    if args.incremental and watermark and entry.get('output_stamp') != output_stamp(args.output):
+        print(f'{args.output} changed since the last sync of {args.event}; fetching everything')
+        watermark = None
+
+    if args.incremental and watermark and existing:
+        fetched = fetch_updated_items(args, watermark)
+        print(f'{len(fetched)} items updated since {watermark}')
+        merged = {**existing, **{item['item']['id']: item for item in fetched}}
+    else:
+        fetched = asyncio.run(fetch_items(args))
+        merged = {item['item']['id']: item for item in fetched}
+
+    changed = [item for item in fetched if existing.get(item['item']['id']) != item]
+    delta_path = args.delta or os.path.splitext(args.output)[0] + '.delta.jsonl'
+    write_items(changed, delta_path)
+    count = write_items(merged.values(), args.output)
+    print(f'Wrote {count} sessions to {args.output} ({len(changed)} new or changed, in {delta_path})')
+
+    if merged:
+        state[key] = {
+            'watermark': max(item['item'].get('dateUpdated', '') for item in merged.values()),
+            'synced_at': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+            'event': event_tag(args.event),
+            'output': output,
+            'output_stamp': output_stamp(args.output),
+        }
+        save_state(state, args.state)
 
-    with open('sessions.jsonl', 'w') as f:
-        for page in range(18):
-            url = f'https://aws.amazon.com/api/dirs/items/search?item.directoryId=events-cards-interactive-emea-event-agenda&item.locale=en_US&tags.id=GLOBAL%23local-tags-emea-event-agenda-event-name%23summit-johannesburg-2025&sort_by=item.dateCreated&sort_order=asc&size=8&page={page}'
-            response = s.get(url)
-            data = response.json()
-            for item in data.get('items', []):
-                f.write(json.dumps(item) + '\n')
 
 if __name__ == '__main__':
-    fetch_sessions()
+    fetch_sessions(parse_args())
@@ -0,0 +1,146 @@
+import gzip
+import io
+import json
+import mmap
+import os
+from typing import List, Optional
+
+try:
+    import msgspec
+except ImportError:
+    # Optional: typed decoding that skips the fields nobody asked for
+    msgspec = None
+try:
+    import orjson
+except ImportError:
+    # Optional: a faster full decoder when msgspec isn't installed
+    orjson = None
+try:
+    import zstandard
+except ImportError:
+    # Optional: only needed to read .zst files
+    zstandard = None
+
+# Decompressed bytes buffered per read from .gz/.zst files
+READ_CHUNK = 1024 * 1024
+COMPRESSED_EXTS = ('.gz', '.zst')
+
+
+def is_compressed(path):
+    return path.endswith(COMPRESSED_EXTS)
+
+
+def open_lines(path, start=0, end=None):
+    """Raw lines of a JSONL file, plain, gzip or zstd.
+
+    Plain files are memory-mapped, and only the lines that start within [start, end) are
+    returned. Compressed files are decompressed as a stream and always read whole.
+    """
+    if is_compressed(path):
+        return _stream_lines(path)
+    return _mapped_lines(path, start, end)
+
+
+def _stream_lines(path):
+    if path.endswith('.zst'):
+        if zstandard is None:
+            raise RuntimeError(f'{path}: reading .zst files needs the zstandard package')
+        reader = zstandard.ZstdDecompressor().stream_reader(open(path, 'rb'), closefd=True)
+        stream = io.BufferedReader(reader, READ_CHUNK)
+    else:
+        stream = io.BufferedReader(gzip.open(path, 'rb'), READ_CHUNK)
+    with stream:
+        yield from stream
+
+
+def _mapped_lines(path, start, end):
+    with open(path, 'rb') as f:
+        size = os.fstat(f.fileno()).st_size
+        if not size:
+            return
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            end = size if end is None else min(end, size)
+            pos = start
+            if start:
+                # The line running over `start` belongs to the previous range
+                newline = mm.find(b'\n', start - 1)
+                pos = size if newline < 0 else newline + 1
+            while pos < end:
+                newline = mm.find(b'\n', pos)
+                stop = size if newline < 0 else newline + 1
+                yield mm[pos:stop]
+                pos = stop
+
+
+def _projection_type(fields):
+    """A msgspec Struct type that decodes only the given dotted paths.
+
+    'tags[].name' reaches into the objects of a list. Everything else in the line is skipped
+    by the decoder without being built.
+    """
+    tree = {}
+    for field in fields:
+        node = tree
+        *parents, leaf = field.split('.')
+        for key in parents:
+            node = node.setdefault(key, {})
+            if node is None:
+                break
+        else:
+            node[leaf] = None
+
+    def struct(node, name):
+        attrs = []
+        rename = {}
+        for i, (key, child) in enumerate(node.items()):
+            is_list = key.endswith('[]')
+            key = key[:-2] if is_list else key
+            value_type = object if child is None else Optional[struct(child, f'{name}_{i}')]
+            if is_list:
+                value_type = Optional[List[value_type]]
+            attrs.append((f'f{i}', value_type, None))
+            rename[f'f{i}'] = key
+        return msgspec.defstruct(name, attrs, rename=rename, omit_defaults=True)
+
+    return struct(tree, 'Record')
+
+
+def record_decoder(fields=None):
+    """Returns (decode, errors): a function from a line to a dict, and what it raises on bad lines.
+
+    With msgspec and `fields`, the dict holds only those paths (missing ones are left out);
+    the other decoders return the whole record.
+    """
+    if msgspec is not None:
+        if fields:
+            decoder = msgspec.json.Decoder(_projection_type(fields))
+            to_builtins = msgspec.to_builtins
+            return (lambda line: to_builtins(decoder.decode(line))), (msgspec.DecodeError,)
+        return msgspec.json.Decoder().decode, (msgspec.DecodeError,)
+    if orjson is not None:
+        return orjson.loads, (orjson.JSONDecodeError,)
+    return json.loads, (ValueError,)
+
+
+def _decode_lines(lines, decode, errors):
+    for line in lines:
+        # Blank lines, partial writes and anything that isn't an object are dropped before decoding
+        if line.lstrip()[:1] != b'{':
+            continue
+        try:
+            yield decode(line)
+        except errors:
+            continue
+
+
+def read_records(paths, fields=None):
+    """Records from one or more JSONL files, skipping malformed lines. See record_decoder for `fields`."""
+    decode, errors = record_decoder(fields)
+    for path in paths:
+        yield from _decode_lines(open_lines(path), decode, errors)
+
+
+def read_range(path, start, end, fields=None):
+    """Records from the lines of a plain JSONL file that start within [start, end)."""
+    decode, errors = record_decoder(fields)
+    yield from _decode_lines(open_lines(path, start, end), decode, errors)
@@ -0,0 +1,222 @@
+import argparse
+import heapq
+from bisect import bisect_right
+from collections import Counter
+
+from session_store import format_minutes, open_store
+from text_index import open_index
+
+# Session times have no date, so each event gets its own day on a shared timeline:
+# minute m of the event whose string id is e sits at e * MINUTES_PER_DAY + m
+MINUTES_PER_DAY = 24 * 60
+
+
+class IntervalTree:
+    """Centered interval tree over half-open (start, end, row) intervals.
+
+    Finding the intervals that contain a point takes O(log n + hits).
+    """
+
+    def __init__(self, intervals):
+        self.root = self._build([iv for iv in intervals if iv[1] > iv[0]])
+
+    def _build(self, intervals):
+        if not intervals:
+            return None
+        center = sorted(iv[0] for iv in intervals)[len(intervals) // 2]
+        here = [iv for iv in intervals if iv[0] <= center < iv[1]]
+        left = [iv for iv in intervals if iv[1] <= center]
+        right = [iv for iv in intervals if iv[0] > center]
+        by_start = sorted(here)
+        by_end = sorted(here, key=lambda iv: iv[1], reverse=True)
+        return center, by_start, by_end, self._build(left), self._build(right)
+
+    def at(self, point):
+        hits = []
+        node = self.root
+        while node:
+            center, by_start, by_end, left, right = node
+            # Every interval in this node contains the center, so one bound decides
+            if point < center:
+                for iv in by_start:
+                    if iv[0] > point:
+                        break
+                    hits.append(iv)
+                node = left
+            else:
+                for iv in by_end:
+                    if iv[1] <= point:
+                        break
+                    hits.append(iv)
+                node = right
+        return hits
+
+
+class Schedule:
+    """Timed sessions of a SessionStore, indexed for point, concurrency and overlap queries.
+
+    Built once per store (or subset of rows); sessions without a usable time are left out.
+    """
+
+    def __init__(self, store, rows=None):
+        self.store = store
+        self.by_row = {}
+        changes = Counter()
+        for row in range(len(store)) if rows is None else rows:
+            start, end = store.start[row], store.end[row]
+            if start < 0 or end <= start:
+                continue
+            offset = store.event[row] * MINUTES_PER_DAY
+            self.by_row[row] = (offset + start, offset + end, row)
+            changes[offset + start] += 1
+            changes[offset + end] -= 1
+        self.tree = IntervalTree(self.by_row.values())
+        self._subsets = {}
+
+        # Sweep line: how many sessions run from each change point until the next
+        self.change_points = sorted(changes)
+        self.levels = []
+        running = 0
+        for point in self.change_points:
+            running += changes[point]
+            self.levels.append(running)
+
+    def subset(self, column, value):
+        """The schedule of the rows whose string column equals value (cached)."""
+        key = column, value
+        if key not in self._subsets:
+            rows = [row for row in self.store.rows_where(column, value) if row in self.by_row]
+            self._subsets[key] = Schedule(self.store, rows)
+        return self._subsets[key]
+
+    def to_point(self, event, minutes):
+        return self.store.string_id(event) * MINUTES_PER_DAY + minutes
+
+    def describe(self, point):
+        event, minutes = divmod(point, MINUTES_PER_DAY)
+        return self.store.strings[event], format_minutes(minutes)
+
+    def at(self, point):
+        """Rows running at the point, by start time."""
+        return [row for _, _, row in sorted(self.tree.at(point))]
+
+    def concurrency_at(self, point):
+        i = bisect_right(self.change_points, point) - 1
+        return self.levels[i] if i >= 0 else 0
+
+    def peak(self):
+        """(sessions, point) for the earliest moment with the most sessions running, or None."""
+        if not self.levels:
+            return None
+        count, i = max((level, -i) for i, level in enumerate(self.levels))
+        return count, self.change_points[-i]
+
+    def clashes(self, rows):
+        """Pairs of the given rows whose times overlap, found with a sweep over just those rows."""
+        running = []
+        pairs = []
+        for start, end, row in sorted(self.by_row[r] for r in rows if r in self.by_row):
+            while running and running[0][0] <= start:
+                heapq.heappop(running)
+            pairs.extend((other, row) for _, other in running)
+            heapq.heappush(running, (end, row))
+        return pairs
+
+    def best_agenda(self, weights):
+        """Non-overlapping rows with the largest total weight (weighted interval scheduling).
+
+        weights maps rows to how much each session is worth; O(k log k) in the number of rows.
+        """
+        intervals = sorted((self.by_row[r] for r in weights if r in self.by_row), key=lambda iv: iv[1])
+        ends = [iv[1] for iv in intervals]
+        # best[j]: the best total using only the first j intervals (by end time)
+        best = [0.0]
+        for j, (start, _, row) in enumerate(intervals):
+            before = bisect_right(ends, start, 0, j)
+            best.append(max(best[j], best[before] + weights[row]))
+
+        agenda = []
+        j = len(intervals)
+        while j:
+            if best[j] == best[j - 1]:
+                j -= 1
+                continue
+            start, _, row = intervals[j - 1]
+            agenda.append(row)
+            j = bisect_right(ends, start, 0, j - 1)
+        return agenda[::-1]
+
+
+def parse_clock(value):
+    hours, minutes = map(int, value.split(':'))
+    return hours * 60 + minutes
+
+
+def find_rows(store, keys):
+    """Rows whose session id or title is one of keys."""
+    wanted = set(keys)
+    return [row for row in range(len(store)) if store.value('id', row) in wanted or store.value('title', row) in wanted]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Query the agenda by time.')
+    parser.add_argument('-f', '--file', default='sessions.jsonl')
+    parser.add_argument('--event', help='event name (needed when the file holds several)')
+    parser.add_argument('--location', help='only sessions in this room')
+    parser.add_argument('--type', help='only sessions of this type')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    at = subparsers.add_parser('at', help='sessions running at a time')
+    at.add_argument('time', help='HH:MM')
+    subparsers.add_parser('peak', help='when the most sessions run at once')
+    clashes = subparsers.add_parser('clashes', help='overlaps within a shortlist of session ids or titles')
+    clashes.add_argument('sessions', nargs='+')
+    plan = subparsers.add_parser('plan', help='the best clash-free agenda for some interests')
+    plan.add_argument('interests', help='keywords, as for text_index.py')
+    args = parser.parse_args()
+
+    store = open_store(args.file)
+    schedule = Schedule(store)
+    for column, value in (('event', args.event), ('location', args.location), ('session_type', args.type)):
+        if value:
+            schedule = schedule.subset(column, value)
+
+    def show(row):
+        event, start = schedule.describe(schedule.by_row[row][0])
+        _, end = schedule.describe(schedule.by_row[row][1])
+        where = ', '.join(v for v in (store.value('location', row), store.value('session_type', row)) if v)
+        print(f'{event} {start}-{end}  {store.value("title", row)}  ({where})')
+
+    if args.command == 'at':
+        events = {store.value('event', row) for row in schedule.by_row}
+        event = args.event or (events.pop() if len(events) == 1 else None)
+        if event is None:
+            parser.error('the file holds several events; pick one with --event')
+        if store.string_id(event) is None:
+            parser.error(f'no sessions for event {event}')
+        point = schedule.to_point(event, parse_clock(args.time))
+        rows = schedule.at(point)
+        print(f'{len(rows)} sessions running at {args.time}:')
+        for row in rows:
+            show(row)
+    elif args.command == 'peak':
+        peak = schedule.peak()
+        if peak is None:
+            print('No timed sessions')
+        else:
+            count, point = peak
+            event, time = schedule.describe(point)
+            print(f'Most sessions at once: {count}, from {time} ({event})')
+    elif args.command == 'clashes':
+        for first, second in schedule.clashes(find_rows(store, args.sessions)):
+            print('Clash:')
+            show(first)
+            show(second)
+    else:
+        index = open_index(args.file, store)
+        weights = {row: score for score, row in index.search(args.interests, limit=len(index.docs))}
+        for row in schedule.best_agenda(weights):
+            show(row)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,328 @@
+import argparse
+import json
+import os
+import sys
+from array import array
+from collections import Counter
+
+from jsonl_reader import read_records
+
+SESSION_TYPE_NAMESPACE = 'GLOBAL#local-tags-emea-event-agenda-session-type'
+EVENT_NAMESPACE = 'GLOBAL#local-tags-emea-event-agenda-event-name'
+STORE_VERSION = 2
+# Default store name when ingesting several JSONL files (written next to the first one)
+COMBINED_STORE = 'combined.store'
+# The parts of an API item that flatten_session reads; the JSONL reader decodes nothing else
+SESSION_FIELDS = (
+    'item.id', 'item.additionalFields.title', 'item.additionalFields.heading',
+    'item.additionalFields.level', 'item.additionalFields.location', 'item.additionalFields.body',
+    'item.additionalFields.bodyBack', 'tags[].tagNamespaceId', 'tags[].name',
+)
+# Sentinels in the start/end columns
+NO_TIME = -1     # the body has no "<br> HH:MM - HH:MM" part
+BAD_TIME = -2    # it has one, but it doesn't parse
+
+# Dictionary-encoded: each value is an index into the store's string table
+STRING_COLUMNS = ('id', 'title', 'heading', 'level', 'location', 'session_type', 'event', 'abstract')
+# Minutes since midnight
+TIME_COLUMNS = ('start', 'end')
+
+
+def parse_time_range(body):
+    """Returns (start, end) in minutes from a body like "Speaker, Role <br> 14:00 - 14:45"."""
+    if '<br>' not in body:
+        return NO_TIME, NO_TIME
+    try:
+        time_part = body.split('<br>')[1].strip()
+        start_str, end_str = [t.strip() for t in time_part.split('-')]
+        start_h, start_m = map(int, start_str.split(':'))
+        end_h, end_m = map(int, end_str.split(':'))
+        return start_h * 60 + start_m, end_h * 60 + end_m
+    except (ValueError, IndexError):
+        return BAD_TIME, BAD_TIME
+
+
+def parse_speakers(body):
+    """Speaker entries ("Name, Role, Company") from the part of the body before the time."""
+    speakers = body.split('<br>')[0]
+    return [s.strip() for s in speakers.split('|') if s.strip()]
+
+
+def speaker_name(entry):
+    return entry.split(',')[0].strip()
+
+
+def format_minutes(minutes):
+    return f'{minutes // 60:02d}:{minutes % 60:02d}'
+
+
+# The helpers below treat explicit nulls like missing keys: the msgspec reader drops them, json and orjson keep them
+
+def additional_fields(session):
+    """item.additionalFields of a raw API item ({} if absent)."""
+    return (session.get('item') or {}).get('additionalFields') or {}
+
+
+def session_tags(session):
+    """{tagNamespaceId: name} for a raw API item's tags."""
+    return {t.get('tagNamespaceId'): t.get('name') for t in session.get('tags') or [] if t}
+
+
+def flatten_session(session):
+    """Pulls the fields the store keeps out of one raw API item."""
+    item = session.get('item') or {}
+    fields = additional_fields(session)
+    tags = session_tags(session)
+    body = fields.get('body', '')
+    start, end = parse_time_range(body)
+    return {
+        'id': item.get('id', ''),
+        'title': fields.get('title', ''),
+        'heading': fields.get('heading', ''),
+        'level': fields.get('level', ''),
+        'location': fields.get('location', ''),
+        'session_type': tags.get(SESSION_TYPE_NAMESPACE, ''),
+        'event': tags.get(EVENT_NAMESPACE, ''),
+        'abstract': fields.get('bodyBack', ''),
+        'start': start,
+        'end': end,
+        'speakers': parse_speakers(body),
+    }
+
+
+class SessionStore:
+    """Sessions flattened into typed columns.
+
+    String columns are arrays of indexes into `strings`; `start`/`end` are minute arrays; the
+    speakers of row i are speaker_ids[speaker_offsets[i]:speaker_offsets[i + 1]]. `sources` are
+    the source_stamps of the JSONL files the store was built from.
+    """
+
+    def __init__(self, strings, columns, sources=()):
+        self.strings = strings
+        self.columns = columns
+        self.sources = list(sources)
+        self._string_ids = None
+
+    def __len__(self):
+        return len(self.columns['id'])
+
+    def __getattr__(self, name):
+        try:
+            return self.__dict__['columns'][name]
+        except KeyError:
+            raise AttributeError(name) from None
+
+    def value(self, column, row):
+        return self.strings[self.columns[column][row]]
+
+    def values(self, column):
+        strings = self.strings
+        return [strings[i] for i in self.columns[column]]
+
+    def speakers(self, row):
+        offsets = self.columns['speaker_offsets']
+        return [self.strings[i] for i in self.columns['speaker_ids'][offsets[row]:offsets[row + 1]]]
+
+    def string_id(self, value):
+        """Index of `value` in the string table, or None if no row has it."""
+        if self._string_ids is None:
+            self._string_ids = {s: i for i, s in enumerate(self.strings)}
+        return self._string_ids.get(value)
+
+    def rows_where(self, column, value):
+        """Rows whose string column equals `value`, comparing integer ids rather than strings."""
+        target = self.string_id(value)
+        return [row for row, i in enumerate(self.columns[column]) if i == target]
+
+
+def build_store(sessions, sources=()):
+    """Builds a SessionStore from an iterable of raw API items (read from the files `sources` stamps)."""
+    strings, string_ids = [], {}
+
+    def intern(value):
+        i = string_ids.get(value)
+        if i is None:
+            i = string_ids[value] = len(strings)
+            strings.append(value)
+        return i
+
+    columns = {name: array('I') for name in STRING_COLUMNS}
+    columns.update({name: array('h') for name in TIME_COLUMNS})
+    columns['speaker_offsets'] = array('I', [0])
+    columns['speaker_ids'] = array('I')
+    for session in sessions:
+        row = flatten_session(session)
+        for name in STRING_COLUMNS:
+            columns[name].append(intern(row[name]))
+        for name in TIME_COLUMNS:
+            columns[name].append(row[name])
+        columns['speaker_ids'].extend(intern(s) for s in row['speakers'])
+        columns['speaker_offsets'].append(len(columns['speaker_ids']))
+    return SessionStore(strings, columns, sources)
+
+
+def source_stamps(paths):
+    """[path, size, mtime_ns] for each JSONL file; a saved store is only reused while these match."""
+    stamps = []
+    for path in paths:
+        stat = os.stat(path)
+        stamps.append([os.path.abspath(path), stat.st_size, stat.st_mtime_ns])
+    return stamps
+
+
+def read_sessions(paths):
+    """Raw API items (just SESSION_FIELDS where the decoder allows) from plain, .gz or .zst JSONL files."""
+    return read_records(paths, SESSION_FIELDS)
+
+
+def save_store(store, path):
+    """One JSON header line (sources, string table and column layout), then each column's raw bytes."""
+    header = {
+        'version': STORE_VERSION,
+        'byteorder': sys.byteorder,
+        'sources': store.sources,
+        'strings': store.strings,
+        'columns': [[name, column.typecode, len(column)] for name, column in store.columns.items()],
+    }
+    temp_path = path + '.tmp'
+    with open(temp_path, 'wb') as f:
+        f.write(json.dumps(header).encode('utf-8') + b'\n')
+        for column in store.columns.values():
+            column.tofile(f)
+    os.replace(temp_path, path)
+
+
+def load_store(path, sources=None):
+    """Loads a store written by save_store.
+
+    Returns None if it is from another store version or, given `sources`, was built from other
+    files (or other versions of them).
+    """
+    with open(path, 'rb') as f:
+        header = json.loads(f.readline())
+        if header.get('version') != STORE_VERSION:
+            return None
+        if sources is not None and header['sources'] != sources:
+            return None
+        columns = {}
+        for name, typecode, length in header['columns']:
+            column = array(typecode)
+            column.fromfile(f, length)
+            if header['byteorder'] != sys.byteorder:
+                column.byteswap()
+            columns[name] = column
+    return SessionStore(header['strings'], columns, header['sources'])
+
+
+def store_path_for(jsonl_path):
+    return os.path.splitext(jsonl_path)[0] + '.store'
+
+
+def open_store(jsonl_path):
+    """Returns the store for a sessions JSONL file, (re)building it unless the saved one was built
+    from exactly this file, as it is now."""
+    path = store_path_for(jsonl_path)
+    sources = source_stamps([jsonl_path])
+    if os.path.exists(path):
+        store = load_store(path, sources)
+        if store is not None:
+            return store
+    store = build_store(read_sessions([jsonl_path]), sources)
+    save_store(store, path)
+    return store
+
+
+def summarize(store):
+    """Answers the questions in insights_and_queries.md in a single pass over the columns."""
+    strings = store.strings
+    types = Counter()
+    missing_time = Counter()
+    durations = Counter()
+    start_slots = Counter()
+    start_slot_types = Counter()
+    locations = Counter()
+    title_counts = Counter()
+    for title, location, stype, start, end in zip(
+        store.title, store.location, store.session_type, store.start, store.end
+    ):
+        types[stype] += 1
+        locations[location] += 1
+        title_counts[title] += 1
+        if start < 0:
+            missing_time[stype] += 1
+            continue
+        durations[end - start] += 1
+        start_slots[start] += 1
+        start_slot_types[start, stype] += 1
+
+    return {
+        'sessions': len(store),
+        'unique_titles': len(title_counts),
+        'repeated': {strings[t]: n for t, n in title_counts.most_common() if n > 1},
+        'types': {strings[t]: n for t, n in types.most_common()},
+        'locations': sorted(strings[loc] for loc in locations),
+        'missing_time': {strings[t]: n for t, n in missing_time.most_common()},
+        'durations': dict(durations.most_common()),
+        'start_slots': {format_minutes(m): n for m, n in sorted(start_slots.items())},
+        'start_slot_types': {
+            f'{format_minutes(m)} {strings[t]}': n for (m, t), n in sorted(start_slot_types.items())
+        },
+    }
+
+
+def print_report(summary):
+    print(f"{summary['sessions']} sessions, {summary['unique_titles']} unique titles "
+          f"({summary['sessions'] - summary['unique_titles']} repeats)")
+    print(f"Missing a time: {sum(summary['missing_time'].values())} {summary['missing_time']}")
+    print(f"Session types: {summary['types']}")
+    print('Durations (minutes: sessions):', ', '.join(f'{d}: {n}' for d, n in summary['durations'].items()))
+    if summary['start_slots']:
+        busiest = max(summary['start_slots'], key=summary['start_slots'].get)
+        print(f"Busiest start time: {busiest} with {summary['start_slots'][busiest]} sessions")
+    print('Sessions per start time:')
+    for slot, n in summary['start_slots'].items():
+        print(f'  {slot}  {n}')
+    print('Start time and type:')
+    for slot_type, n in summary['start_slot_types'].items():
+        print(f'  {slot_type}: {n}')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Flatten session JSONL into a columnar store and query it.')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    ingest = subparsers.add_parser('ingest', help='build a store from one or more JSONL files')
+    ingest.add_argument('inputs', nargs='+')
+    ingest.add_argument(
+        '-o', '--output', help=f'store file (default: <input>.store for one input, else {COMBINED_STORE} next to the first)'
+    )
+    report = subparsers.add_parser('report', help='print the agenda summary for a JSONL file')
+    report.add_argument('input', nargs='?', default='sessions.jsonl')
+    report.add_argument('--store', help='summarize this store file (say, one made by ingest) instead')
+    report.add_argument('--json', action='store_true', help='print the summary as JSON')
+    args = parser.parse_args()
+
+    if args.command == 'ingest':
+        store = build_store(read_sessions(args.inputs), source_stamps(args.inputs))
+        output = args.output
+        if not output:
+            first = args.inputs[0]
+            output = store_path_for(first) if len(args.inputs) == 1 else os.path.join(os.path.dirname(first), COMBINED_STORE)
+        save_store(store, output)
+        print(f'Stored {len(store)} sessions ({len(store.strings)} distinct strings) in {output}')
+    else:
+        if args.store:
+            store = load_store(args.store)
+            if store is None:
+                parser.error(f'{args.store} was written by another version of this script; ingest it again')
+        else:
+            store = open_store(args.input)
+        summary = summarize(store)
+        if args.json:
+            print(json.dumps(summary, indent=2))
+        else:
+            print_report(summary)
+
+
+if __name__ == '__main__':
+    main()
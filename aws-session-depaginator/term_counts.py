@@ -0,0 +1,227 @@
+import argparse
+import hashlib
+import heapq
+import os
+from array import array
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+
+from jsonl_reader import is_compressed, read_range
+from session_store import EVENT_NAMESPACE, SESSION_TYPE_NAMESPACE, additional_fields, session_tags
+from text_index import tokenize
+
+# Each worker task reads this much of a JSONL file, so one big dump is split across processes too
+CHUNK_BYTES = 64 * 1024 * 1024
+WORKERS = os.cpu_count() or 1
+# Count-Min sketch: estimates exceed the true count by at most ~e/width of the total,
+# except with probability e^-depth
+SKETCH_WIDTH = 2 ** 16
+SKETCH_DEPTH = 4
+# Heavy-hitter candidates kept per group in sketch mode
+SKETCH_CAPACITY = 1000
+
+# Text fields that can be counted, by their name in item.additionalFields
+FIELDS = {'title': 'title', 'abstract': 'bodyBack'}
+# Breakdowns, by tag namespace
+GROUPS = {'event': EVENT_NAMESPACE, 'type': SESSION_TYPE_NAMESPACE}
+
+
+class CountMinSketch:
+    """Fixed-size frequency table; estimates never undercount. Sketches of the same size merge by addition."""
+
+    def __init__(self, width=SKETCH_WIDTH, depth=SKETCH_DEPTH):
+        self.width = width
+        self.depth = depth
+        self.table = array('Q', bytes(8 * width * depth))
+        self.total = 0
+
+    def _cells(self, term):
+        # A stable hash (unlike hash()), so sketches from different processes line up
+        digest = hashlib.blake2b(term.encode('utf-8'), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], 'little')
+        h2 = int.from_bytes(digest[8:], 'little') | 1
+        return [row * self.width + (h1 + row * h2) % self.width for row in range(self.depth)]
+
+    def add(self, term, count=1):
+        table = self.table
+        for cell in self._cells(term):
+            table[cell] += count
+        self.total += count
+
+    def estimate(self, term):
+        return min(self.table[cell] for cell in self._cells(term))
+
+    def merge(self, other):
+        self.table = array('Q', map(sum, zip(self.table, other.table)))
+        self.total += other.total
+
+
+class SpaceSaving:
+    """The `capacity` heaviest terms of a stream, with upper bounds on their counts.
+
+    A new term arriving when the summary is full replaces the lightest one and inherits its count,
+    so memory never grows past `capacity` terms. Any term not kept occurred at most `floor` times,
+    and two summaries merge without losing that guarantee (see "Mergeable Summaries", Agarwal et al.).
+    """
+
+    def __init__(self, capacity=SKETCH_CAPACITY):
+        self.counts = {}
+        self.floor = 0
+        self.capacity = capacity
+        # One (count, term) per kept term; counts only grow, so a stale entry is refreshed when it surfaces
+        self._heap = []
+
+    def add(self, term, count=1):
+        counts = self.counts
+        if term in counts:
+            counts[term] += count
+            return
+        if len(counts) >= self.capacity:
+            while True:
+                lightest, victim = heapq.heappop(self._heap)
+                if counts[victim] == lightest:
+                    break
+                heapq.heappush(self._heap, (counts[victim], victim))
+            del counts[victim]
+            self.floor = max(self.floor, lightest)
+        counts[term] = self.floor + count
+        heapq.heappush(self._heap, (counts[term], term))
+
+    def merge(self, other):
+        terms = self.counts.keys() | other.counts.keys()
+        merged = {t: self.counts.get(t, self.floor) + other.counts.get(t, other.floor) for t in terms}
+        ranked = sorted(merged.items(), key=lambda tc: tc[1], reverse=True)
+        dropped = ranked[self.capacity:]
+        self.floor = max([self.floor + other.floor] + [count for _, count in dropped[:1]])
+        self.counts = dict(ranked[:self.capacity])
+        self._heap = [(count, term) for term, count in self.counts.items()]
+        heapq.heapify(self._heap)
+
+
+class TermSketch:
+    """Approximate counts in fixed memory: Space-Saving picks the candidates, Count-Min tightens their counts."""
+
+    def __init__(self):
+        self.heavy = SpaceSaving()
+        self.cms = CountMinSketch()
+
+    def add(self, term, count=1):
+        self.heavy.add(term, count)
+        self.cms.add(term, count)
+
+    def merge(self, other):
+        self.heavy.merge(other.heavy)
+        self.cms.merge(other.cms)
+
+    def estimate(self, term):
+        return min(self.heavy.counts.get(term, self.heavy.floor), self.cms.estimate(term))
+
+    def most_common(self, n):
+        estimates = ((term, self.estimate(term)) for term in self.heavy.counts)
+        return sorted(estimates, key=lambda tc: tc[1], reverse=True)[:n]
+
+
+def terms(text, ngram=1):
+    """Words (or runs of `ngram` adjacent words) of the text; n-grams never span a stop word."""
+    tokens = tokenize(text)
+    if ngram == 1:
+        return [word for _, word in tokens]
+    return [
+        ' '.join(word for _, word in tokens[i:i + ngram])
+        for i in range(len(tokens) - ngram + 1)
+        if tokens[i + ngram - 1][0] - tokens[i][0] == ngram - 1
+    ]
+
+
+def file_chunks(path):
+    if is_compressed(path):
+        # A compressed stream can't be entered mid-way; one worker reads it whole
+        return [(0, None)]
+    size = os.path.getsize(path)
+    return [(start, min(start + CHUNK_BYTES, size)) for start in range(0, size, CHUNK_BYTES)]
+
+
+def count_chunk(task):
+    """Counts one chunk into {group: Counter}, or {group: TermSketch} in sketch mode.
+
+    In sketch mode terms go straight into the sketches, so memory stays fixed however big the chunk
+    (a compressed file is one chunk) or its vocabulary.
+    """
+    path, start, end, field, ngram, group_by, sketch = task
+    fields = ['item.additionalFields.' + FIELDS[field]]
+    if group_by:
+        fields += ['tags[].tagNamespaceId', 'tags[].name']
+    counts = {}
+    for session in read_range(path, start, end, fields):
+        text = additional_fields(session).get(FIELDS[field])
+        if not text:
+            continue
+        group = session_tags(session).get(GROUPS[group_by]) or '' if group_by else ''
+        if sketch:
+            group_sketch = counts.get(group)
+            if group_sketch is None:
+                group_sketch = counts[group] = TermSketch()
+            for term in terms(text, ngram):
+                group_sketch.add(term)
+        else:
+            counts.setdefault(group, Counter()).update(terms(text, ngram))
+    return counts
+
+
+def count_terms(paths, field='title', ngram=1, group_by=None, sketch=False, workers=WORKERS):
+    """Counts terms over many JSONL files in parallel and merges the per-chunk counts.
+
+    Returns {group: Counter} (a single '' group unless group_by is 'event' or 'type'), or
+    {group: TermSketch} with sketch=True, whose size doesn't grow with the corpus.
+    """
+    tasks = [(path, start, end, field, ngram, group_by, sketch) for path in paths for start, end in file_chunks(path)]
+    totals = {}
+
+    def merge(partial):
+        for group, counts in partial.items():
+            if group not in totals:
+                totals[group] = counts
+            elif sketch:
+                totals[group].merge(counts)
+            else:
+                totals[group].update(counts)
+
+    if workers <= 1 or len(tasks) <= 1:
+        for task in tasks:
+            merge(count_chunk(task))
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            for partial in executor.map(count_chunk, tasks):
+                merge(partial)
+    return totals
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Count words or n-grams across session JSONL files.')
+    parser.add_argument('inputs', nargs='*', default=['sessions.jsonl'])
+    parser.add_argument('--field', choices=FIELDS, default='title')
+    parser.add_argument('-n', '--ngram', type=int, default=1, help='count runs of N adjacent words')
+    parser.add_argument('--by', choices=GROUPS, help='break the counts down by event or session type')
+    parser.add_argument('--top', type=int, default=20)
+    parser.add_argument('--hapax', action='store_true', help='list the terms that occur once instead')
+    parser.add_argument('--sketch', action='store_true', help='approximate top terms in fixed memory')
+    parser.add_argument('-j', '--workers', type=int, default=WORKERS)
+    args = parser.parse_args()
+    if args.hapax and args.sketch:
+        parser.error('--hapax needs exact counts; drop --sketch')
+
+    totals = count_terms(args.inputs, args.field, args.ngram, args.by, args.sketch, args.workers)
+    for group in sorted(totals):
+        if args.by:
+            print(f'{group or "(none)"}:')
+        counts = totals[group]
+        if args.hapax:
+            for term in sorted(t for t, c in counts.items() if c == 1):
+                print(f'- {term}')
+        else:
+            for term, count in counts.most_common(args.top):
+                print(f'- {term}: {count}')
+
+
+if __name__ == '__main__':
+    main()
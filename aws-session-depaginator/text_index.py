@@ -0,0 +1,173 @@
+import argparse
+import heapq
+import math
+import os
+import pickle
+import re
+from collections import defaultdict
+
+from session_store import open_store, speaker_name
+
+STOP_WORDS = {
+    'a', 'an', 'the', 'and', 'with', 'for', 'to', 'in', 'on', 'of', 'is', 'at',
+    'your', 'you', 'aws', 'amazon', 'it', 'what', 'how', 'that', 'by',
+    'from', 'into', 'its', 'not', 'be', 'are', 'can', 'will', 'up', 'down'
+}
+
+INDEX_VERSION = 2
+FIELDS = ('title', 'abstract', 'speakers')
+# A match in a title counts for more than one in the abstract
+FIELD_WEIGHTS = {'title': 2.0, 'speakers': 1.5, 'abstract': 1.0}
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+
+def tokenize(text):
+    """Lowercased word tokens as (position, word). Stop words are left out but keep their position."""
+    return [(pos, word) for pos, word in enumerate(re.findall(r'\b\w+\b', text.lower())) if word not in STOP_WORDS]
+
+
+class TextIndex:
+    """Positional inverted index over session titles, abstracts and speaker names.
+
+    postings[field][term] maps each document (a session store row) to the term's positions
+    there. Terms are kept in order of first appearance.
+    """
+
+    def __init__(self, docs, postings, lengths):
+        self.docs = docs
+        self.postings = postings
+        self.lengths = lengths
+        self.avg_lengths = {f: (sum(lengths[f]) / len(lengths[f]) if lengths[f] else 0.0) for f in lengths}
+
+    def term_stats(self, field='title'):
+        """{term: (occurrences, documents)} for one field, in order of first appearance."""
+        return {
+            term: (sum(len(positions) for positions in docs.values()), len(docs))
+            for term, docs in self.postings[field].items()
+        }
+
+    def top_terms(self, n, field='title', stop_words=()):
+        """The n most frequent terms, ties in order of first appearance (like Counter.most_common)."""
+        stats = [(term, count) for term, (count, _) in self.term_stats(field).items() if term not in stop_words]
+        return sorted(stats, key=lambda ts: ts[1], reverse=True)[:n]
+
+    def hapax_terms(self, field='title', stop_words=()):
+        """Terms that occur exactly once in the field."""
+        return [term for term, (count, _) in self.term_stats(field).items() if count == 1 and term not in stop_words]
+
+    def phrase_docs(self, field, phrase):
+        """Documents where the phrase's terms appear at the same relative positions in `field`."""
+        tokens = tokenize(phrase)
+        if not tokens:
+            return set()
+        postings = self.postings[field]
+        if any(term not in postings for _, term in tokens):
+            return set()
+        first_offset = tokens[0][0]
+        # Start from the rarest term's documents
+        candidates = set(min((postings[term] for _, term in tokens), key=len))
+        matches = set()
+        for doc in candidates:
+            if not all(doc in postings[term] for _, term in tokens):
+                continue
+            position_sets = [(offset - first_offset, set(postings[term][doc])) for offset, term in tokens]
+            if any(all(start + delta in positions for delta, positions in position_sets)
+                   for start in postings[tokens[0][1]][doc]):
+                matches.add(doc)
+        return matches
+
+    def search(self, query, limit=10, fields=FIELDS):
+        """BM25 ranking over the given fields. Quoted parts of the query must match as phrases.
+
+        Returns [(score, doc)] best first; see `docs` for each document's id and title.
+        """
+        phrases = re.findall(r'"([^"]+)"', query)
+        terms = [term for _, term in tokenize(re.sub(r'"[^"]+"', ' ', query))]
+        terms += [term for phrase in phrases for _, term in tokenize(phrase)]
+
+        doc_count = len(self.docs)
+        scores = defaultdict(float)
+        for field in fields:
+            postings = self.postings[field]
+            lengths = self.lengths[field]
+            avg_length = self.avg_lengths[field] or 1.0
+            for term in set(terms):
+                docs = postings.get(term)
+                if not docs:
+                    continue
+                idf = math.log(1 + (doc_count - len(docs) + 0.5) / (len(docs) + 0.5))
+                for doc, positions in docs.items():
+                    tf = len(positions)
+                    norm = BM25_K1 * (1 - BM25_B + BM25_B * lengths[doc] / avg_length)
+                    scores[doc] += FIELD_WEIGHTS[field] * idf * tf * (BM25_K1 + 1) / (tf + norm)
+
+        for phrase in phrases:
+            matching = set().union(*(self.phrase_docs(field, phrase) for field in fields))
+            scores = {doc: score for doc, score in scores.items() if doc in matching}
+        return heapq.nlargest(limit, ((score, doc) for doc, score in scores.items()))
+
+
+def build_index(store):
+    """Tokenizes every session's title, abstract and speaker names once."""
+    postings = {field: {} for field in FIELDS}
+    lengths = {field: [] for field in FIELDS}
+    docs = list(zip(store.values('id'), store.values('title')))
+    abstracts = store.values('abstract')
+    for doc, (_, title) in enumerate(docs):
+        texts = {
+            'title': title,
+            'abstract': abstracts[doc],
+            'speakers': ' | '.join(speaker_name(s) for s in store.speakers(doc)),
+        }
+        for field, text in texts.items():
+            tokens = tokenize(text)
+            lengths[field].append(len(tokens))
+            field_postings = postings[field]
+            for pos, term in tokens:
+                field_postings.setdefault(term, {}).setdefault(doc, []).append(pos)
+    return TextIndex(docs, postings, lengths)
+
+
+def index_path_for(jsonl_path):
+    return os.path.splitext(jsonl_path)[0] + '.index'
+
+
+def open_index(jsonl_path, store=None):
+    """Returns the index for a sessions JSONL file, (re)building it unless it was built from the same store.
+
+    Index documents are store rows, so the index is only reused while the store (`store`, if the
+    caller has it open already) comes from the same source files it was built from.
+    """
+    if store is None:
+        store = open_store(jsonl_path)
+    path = index_path_for(jsonl_path)
+    if os.path.exists(path):
+        with open(path, 'rb') as f:
+            saved = pickle.load(f)
+        if saved[0] == INDEX_VERSION and saved[1] == store.sources:
+            return TextIndex(*saved[2:])
+    index = build_index(store)
+    temp_path = path + '.tmp'
+    with open(temp_path, 'wb') as f:
+        saved = (INDEX_VERSION, store.sources, index.docs, index.postings, index.lengths)
+        pickle.dump(saved, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(temp_path, path)
+    return index
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Search session titles, abstracts and speakers.')
+    parser.add_argument('query', help='keywords; put phrases in double quotes')
+    parser.add_argument('-f', '--file', default='sessions.jsonl')
+    parser.add_argument('-n', '--limit', type=int, default=10)
+    parser.add_argument('--field', choices=FIELDS, action='append', help='search only these fields')
+    args = parser.parse_args()
+
+    index = open_index(args.file)
+    for score, doc in index.search(args.query, args.limit, args.field or FIELDS):
+        print(f'{score:6.2f}  {index.docs[doc][1]}')
+
+
+if __name__ == '__main__':
+    main()
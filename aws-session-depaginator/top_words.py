@@ -1,35 +1,15 @@
-
-
-import json
-import re
-from collections import Counter
-
-STOP_WORDS = {
-    'a', 'an', 'the', 'and', 'with', 'for', 'to', 'in', 'on', 'of', 'is', 'at', 
-    'your', 'you', 'aws', 'amazon', 'it', 'what', 'how', 'that', 'by', 
-    'from', 'into', 'its', 'not', 'be', 'are', 'can', 'will', 'up', 'down'
-}
+from text_index import open_index
 
 def get_top_words(file_path, top_n=5):
-    word_counts = Counter()
-    with open(file_path, 'r') as f:
-        for line in f:
-            try:
-                session = json.loads(line)
-                title = session.get("item", {}).get("additionalFields", {}).get("title", "")
-                if title:
-                    # Normalize the text: lowercase, find all word sequences
-                    words = re.findall(r'\b\w+\b', title.lower())
-                    # Filter out stop words
-                    filtered_words = [word for word in words if word not in STOP_WORDS]
-                    word_counts.update(filtered_words)
-            except json.JSONDecodeError:
-                continue
+    # The index already counts every title word (minus stop words) in order of first appearance
+    top_words = open_index(file_path).top_terms(top_n, field='title')
     
     print(f"Top {top_n} most common words in session titles:")
-    for word, count in word_counts.most_common(top_n):
+    for word, count in top_words:
         print(f"- {word.capitalize()}: {count} times")
 
 if __name__ == "__main__":
     get_top_words('sessions.jsonl', top_n=20)
 
+
+
@@ -0,0 +1,499 @@
+import os
+import sys
+import math
+import signal
+import struct
+import argparse
+import threading
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from PIL import Image
+import pillow_heif
+
+# Lets Image.open decode HEIC straight into a PIL image (and use embedded thumbnails for draft())
+pillow_heif.register_heif_opener()
+
+# === Configuration ===
+HEIC_EXTS = (".heic", ".heif")
+DEFAULT_QUALITY = 90
+# Parallel conversions (processes); decoding and JPEG encoding are CPU bound, so one per core
+WORKERS = os.cpu_count() or 1
+# Files handed to the pool ahead of time per worker: enough to keep every core busy, small enough
+# that a cancel takes effect quickly
+QUEUE_DEPTH = 2
+# JPEG has no alpha channel; other modes are converted to RGB before saving
+JPEG_MODES = ("RGB", "L", "CMYK")
+# Rough working memory per decoded pixel: libheif's buffer plus Pillow's copy (4 bytes per RGB pixel)
+BYTES_PER_PIXEL = 8
+# A conversion only starts when the estimated memory of everything converting fits in this many MB
+# (None = no limit). An image bigger than the whole budget still converts, on its own
+MEMORY_BUDGET_MB = None
+# The CLI prints a progress line every this many files
+PROGRESS_EVERY = 100
+# HEIF item types that are images (coded, or derived from other images like grids and overlays)
+HEIF_IMAGE_TYPES = (b"hvc1", b"av01", b"jpeg", b"vvc1", b"unci", b"grid", b"iden", b"iovl")
+# Auxiliary image types that libheif reports as depth maps
+HEIF_DEPTH_TYPES = (b"urn:mpeg:hevc:2015:auxid:2", b"urn:mpeg:mpegB:cicp:systems:auxiliary:depth")
+
+# === Conversion Function ===
+def convert_heic_to_jpeg(input_path, output_dir, quality, max_size=None, all_images=False, thumbnails=False, depth_images=False):
+    """Converts a HEIC to JPEG, keeping its EXIF, ICC profile and XMP.
+
+    With `max_size`, images are scaled to fit within max_size x max_size pixels; when the file
+    embeds a large enough thumbnail, that is decoded instead of the full image.
+
+    Only the primary image is converted unless `all_images` is set, which also exports the other
+    top-level images (burst frames, edited and original pairs) as <name>_<index>.jpg. `thumbnails`
+    and `depth_images` add each converted image's embedded thumbnails (JPEG) and depth maps (PNG).
+    Every image is decoded from a fresh handle and written before the next one is touched, so
+    memory stays at about one decoded image however many the container holds.
+    """
+    try:
+        if not os.path.exists(output_dir):
+            os.makedirs(output_dir, exist_ok=True)
+        base_path = os.path.splitext(get_output_path(input_path, output_dir))[0]
+
+        indexes = []
+        if all_images:
+            heif_file = pillow_heif.open_heif(input_path)  # parses the container; nothing is decoded yet
+            indexes = [i for i in range(len(heif_file)) if i != heif_file.primary_index]
+            del heif_file
+
+        # The primary image goes last: once its JPEG exists, everything else from the file does too
+        for index in indexes + [None]:
+            name = base_path if index is None else f"{base_path}_{index}"
+            save_image(input_path, index, name + ".jpg", quality, max_size)
+            if thumbnails or depth_images:
+                save_auxiliary_images(input_path, index, name, quality, thumbnails, depth_images)
+        return True
+    except Exception as e:
+        print(f"Error converting {input_path}: {e}")
+        return False
+
+def save_image(input_path, index, output_path, quality, max_size=None):
+    """Writes one top-level image of a HEIC (the primary one if `index` is None) as JPEG."""
+    # The opener decodes into the image's own memory and drops libheif's buffer straight after,
+    # so only one full-size bitmap is alive while the JPEG is written
+    with Image.open(input_path, formats=["HEIF"]) as image:
+        if index is not None:
+            image.seek(index)
+        if max_size:
+            # thumbnail() would ask draft() for the whole square box, which rules out most
+            # embedded thumbnails; ask for the size actually needed instead
+            scale = max_size / max(image.size)
+            if scale < 1:
+                image.draft(None, (math.ceil(image.width * scale), math.ceil(image.height * scale)))
+            image.thumbnail((max_size, max_size), Image.Resampling.LANCZOS)
+        else:
+            image.load()
+        # libheif has already applied the rotation, and the opener resets the EXIF orientation to match
+        exif = image.getexif()
+        icc_profile = image.info.get("icc_profile")
+        xmp = image.info.get("xmp")
+        if image.mode not in JPEG_MODES:
+            image = image.convert("RGB")
+
+        save_options = {"quality": quality, "exif": exif}
+        if icc_profile:
+            save_options["icc_profile"] = icc_profile
+        if xmp:
+            save_options["xmp"] = xmp
+        save_atomically(image, output_path, "JPEG", **save_options)
+
+def save_auxiliary_images(input_path, index, name, quality, thumbnails, depth_images):
+    """Writes the embedded thumbnails and/or depth maps of one top-level image, one at a time."""
+    heif_file = pillow_heif.open_heif(input_path)
+    heif_image = heif_file[heif_file.primary_index if index is None else index]
+    if thumbnails:
+        for i in range(len(heif_image.info["thumbnails"])):
+            thumbnail = heif_image.get_thumbnail(i).to_pillow()
+            if thumbnail.mode not in JPEG_MODES:
+                thumbnail = thumbnail.convert("RGB")
+            save_atomically(thumbnail, f"{name}_thumb{i}.jpg", "JPEG", quality=quality)
+    if depth_images:
+        for i, depth_image in enumerate(heif_image.info["depth_images"]):
+            save_atomically(depth_image.to_pillow(), f"{name}_depth{i}.png", "PNG")
+
+def save_atomically(image, output_path, image_format, **options):
+    # Write under a temporary name so an interrupted conversion never leaves a truncated file
+    temp_path = output_path + ".part"
+    image.save(temp_path, image_format, **options)
+    os.replace(temp_path, output_path)
+
+def get_output_path(input_path, output_dir):
+    base_name = os.path.splitext(os.path.basename(input_path))[0]
+    return os.path.join(output_dir, base_name + ".jpg")
+
+def expected_outputs(input_path, output_dir, all_images=False, thumbnails=False, depth_images=False):
+    """Every file convert_heic_to_jpeg writes for `input_path` with these options, or None if the
+    container can't be read. Without the extra outputs that is just the JPEG, and the file isn't opened.
+    """
+    output_path = get_output_path(input_path, output_dir)
+    if not (all_images or thumbnails or depth_images):
+        return [output_path]
+    try:
+        images, primary_index = probe_heif(input_path)
+    except (OSError, ValueError):
+        return None
+    base_path = os.path.splitext(output_path)[0]
+    outputs = []
+    for index, image in enumerate(images):
+        if index != primary_index and not all_images:
+            continue
+        name = base_path if index == primary_index else f"{base_path}_{index}"
+        outputs.append(name + ".jpg")
+        if thumbnails:
+            outputs += [f"{name}_thumb{i}.jpg" for i in range(image["thumbnails"])]
+        if depth_images:
+            outputs += [f"{name}_depth{i}.png" for i in range(image["depth_images"])]
+    return outputs
+
+def is_up_to_date(input_path, output_paths):
+    """True if every output exists and was written after the source last changed."""
+    if not output_paths:
+        return False
+    try:
+        source_mtime = os.stat(input_path).st_mtime_ns
+        return all(os.stat(path).st_mtime_ns >= source_mtime for path in output_paths)
+    except OSError:
+        return False
+
+# === HEIF Headers ===
+def iter_boxes(data, start=0, end=None):
+    """Yields (type, body_start, box_end) for the ISOBMFF boxes in data[start:end]."""
+    end = len(data) if end is None else end
+    while start + 8 <= end:
+        size, box_type = struct.unpack_from(">I4s", data, start)
+        body_start = start + 8
+        if size == 1:
+            size = struct.unpack_from(">Q", data, body_start)[0]
+            body_start += 8
+        elif size == 0:
+            size = end - start
+        if size < body_start - start or start + size > end:
+            raise ValueError(f"truncated {box_type!r} box")
+        yield box_type, body_start, start + size
+        start += size
+
+def read_meta_box(f):
+    """The body of a HEIF file's top-level 'meta' box. Boxes before it (usually just 'ftyp') are
+    skipped by seeking, so the image data is never read.
+    """
+    while True:
+        header = f.read(8)
+        if len(header) < 8:
+            raise ValueError("no 'meta' box")
+        size, box_type = struct.unpack(">I4s", header)
+        header_size = 8
+        if size == 1:
+            size = struct.unpack(">Q", f.read(8))[0]
+            header_size = 16
+        if box_type == b"meta":
+            return f.read(size - header_size if size else -1)
+        if size < header_size:
+            raise ValueError("no 'meta' box")
+        f.seek(size - header_size, os.SEEK_CUR)
+
+def probe_heif(input_path):
+    """Reads a HEIF's headers only: returns (images, primary_index) for its top-level images, in
+    the order libheif (and so pillow_heif) numbers them. Each image is a dict with its "size" and
+    the number of "thumbnails" and "depth_images" attached to it. Raises ValueError if the
+    container can't be parsed.
+    """
+    with open(input_path, "rb") as f:
+        meta = read_meta_box(f)
+    try:
+        return parse_meta_box(meta)
+    except (struct.error, IndexError) as e:
+        raise ValueError(f"malformed 'meta' box: {e}") from e
+
+def parse_meta_box(meta):
+    primary_id = None
+    items = []  # (item_id, item_type, hidden) in 'iinf' order
+    references = []  # (reference_type, from_id, to_ids)
+    properties = []  # (property_type, body_start, box_end), numbered from 1 by 'ipma'
+    associations = {}  # item_id: [property index]
+    # 'meta' is a full box: its children start after the version and flags
+    for box_type, body, box_end in iter_boxes(meta, 4):
+        version = meta[body]
+        if box_type == b"pitm":
+            primary_id = struct.unpack_from(">H" if version == 0 else ">I", meta, body + 4)[0]
+        elif box_type == b"iinf":
+            entries = body + (6 if version == 0 else 8)
+            for entry_type, entry, entry_end in iter_boxes(meta, entries, box_end):
+                entry_version = meta[entry]
+                if entry_type != b"infe" or entry_version < 2:
+                    continue
+                hidden = meta[entry + 3] & 1
+                if entry_version == 2:
+                    item_id, _, item_type = struct.unpack_from(">HH4s", meta, entry + 4)
+                else:
+                    item_id, _, item_type = struct.unpack_from(">IH4s", meta, entry + 4)
+                items.append((item_id, item_type, hidden))
+        elif box_type == b"iref":
+            id_format = "H" if version == 0 else "I"
+            for reference_type, ref, _ in iter_boxes(meta, body + 4, box_end):
+                from_id, count = struct.unpack_from(f">{id_format}H", meta, ref)
+                to_ids = struct.unpack_from(f">{count}{id_format}", meta, ref + struct.calcsize(f">{id_format}H"))
+                references.append((reference_type, from_id, to_ids))
+        elif box_type == b"iprp":
+            for child_type, child, child_end in iter_boxes(meta, body, box_end):
+                if child_type == b"ipco":
+                    properties = list(iter_boxes(meta, child, child_end))
+                elif child_type == b"ipma":
+                    child_version, large_index = meta[child], meta[child + 3] & 1
+                    count = struct.unpack_from(">I", meta, child + 4)[0]
+                    pos = child + 8
+                    for _ in range(count):
+                        item_id = struct.unpack_from(">H" if child_version < 1 else ">I", meta, pos)[0]
+                        pos += 2 if child_version < 1 else 4
+                        indexes = associations.setdefault(item_id, [])
+                        for _ in range(meta[pos]):
+                            if large_index:
+                                indexes.append(struct.unpack_from(">H", meta, pos + 1)[0] & 0x7FFF)
+                                pos += 2
+                            else:
+                                indexes.append(meta[pos + 1] & 0x7F)
+                                pos += 1
+                        pos += 1
+
+    def item_property(item_id, property_type):
+        for index in associations.get(item_id, ()):
+            if 0 < index <= len(properties) and properties[index - 1][0] == property_type:
+                return properties[index - 1]
+        return None
+
+    # Thumbnails and auxiliary images (depth, alpha) point at their image; grid tiles are pointed at
+    thumbnails_of, aux_of, tiles = {}, {}, set()
+    for reference_type, from_id, to_ids in references:
+        if reference_type == b"thmb":
+            for to_id in to_ids:
+                thumbnails_of.setdefault(to_id, []).append(from_id)
+        elif reference_type == b"auxl":
+            for to_id in to_ids:
+                aux_of.setdefault(to_id, []).append(from_id)
+        elif reference_type == b"dimg":
+            tiles.update(to_ids)
+    attached = {i for ids in thumbnails_of.values() for i in ids} | {i for ids in aux_of.values() for i in ids}
+
+    def is_depth(item_id):
+        aux = item_property(item_id, b"auxC")
+        return aux is not None and meta[aux[1] + 4:aux[2]].split(b"\0")[0] in HEIF_DEPTH_TYPES
+
+    images = []
+    primary_index = None
+    for item_id, item_type, hidden in items:
+        if item_type not in HEIF_IMAGE_TYPES or hidden or item_id in attached or item_id in tiles:
+            continue
+        extent = item_property(item_id, b"ispe")
+        if extent is None:
+            raise ValueError(f"image {item_id} has no size")
+        if item_id == primary_id:
+            primary_index = len(images)
+        images.append({
+            "size": struct.unpack_from(">II", meta, extent[1] + 4),
+            "thumbnails": len(thumbnails_of.get(item_id, ())),
+            "depth_images": sum(map(is_depth, aux_of.get(item_id, ()))),
+        })
+    if primary_index is None:
+        raise ValueError("no primary image")
+    return images, primary_index
+
+# === Discovery ===
+def iter_heic_files(root, exclude=None):
+    """Yields HEIC files under `root`, one directory at a time, without listing the whole tree first.
+
+    Symlinked directories are not followed. `exclude` is a directory to leave out (for example an
+    output folder inside the source tree).
+    """
+    exclude = os.path.normcase(os.path.abspath(exclude)) if exclude else None
+    stack = [root]
+    while stack:
+        directory = stack.pop()
+        try:
+            with os.scandir(directory) as it:
+                entries = sorted(it, key=lambda entry: entry.name)
+        except OSError as e:
+            print(f"Skipping {directory}: {e}")
+            continue
+
+        subdirs = []
+        for entry in entries:
+            try:
+                if entry.is_dir(follow_symlinks=False):
+                    if os.path.normcase(os.path.abspath(entry.path)) != exclude:
+                        subdirs.append(entry.path)
+                elif entry.name.lower().endswith(HEIC_EXTS) and entry.is_file():
+                    yield entry.path
+            except OSError:
+                continue
+        # Reversed so directories come off the stack in name order
+        stack.extend(reversed(subdirs))
+
+def estimate_memory(input_path, all_images=False):
+    """Bytes needed to convert a file, from its largest image that will be decoded (headers only)."""
+    try:
+        images, primary_index = probe_heif(input_path)
+    except (OSError, ValueError):
+        return 0  # the worker will report why it can't be read
+    if not all_images:
+        images = [images[primary_index]]
+    return max(width * height for width, height in (image["size"] for image in images)) * BYTES_PER_PIXEL
+
+def tree_jobs(source_dir, output_dir):
+    """Yields (input_path, output_dir) for every HEIC under `source_dir`, mirroring its folders."""
+    for path in iter_heic_files(source_dir, exclude=output_dir):
+        relative_dir = os.path.relpath(os.path.dirname(path), source_dir)
+        yield path, os.path.normpath(os.path.join(output_dir, relative_dir))
+
+# === Batch Engine ===
+def init_worker():
+    # Ctrl+C is handled by the parent, which lets the images already converting finish
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+def convert_jobs(jobs, quality, workers=None, cancel_event=None, skip_existing=False, memory_budget_mb=None, **options):
+    """Converts (input_path, output_dir) jobs on a process pool, yielding (input_path, status).
+
+    `status` is "converted", "failed" or, with `skip_existing`, "skipped" for images whose JPEG is
+    up to date. Jobs are taken from `jobs` lazily, at most `workers * QUEUE_DEPTH` in flight, so a
+    generator over a huge tree is never materialised. With a memory budget (`memory_budget_mb` or
+    MEMORY_BUDGET_MB), a file is only started once its estimated memory fits next to the files
+    already converting. Once `cancel_event` is set no new images are started; the ones already
+    converting are finished. `options` are passed on to convert_heic_to_jpeg.
+    """
+    workers = workers or WORKERS
+    memory_budget_mb = memory_budget_mb or MEMORY_BUDGET_MB
+    memory_budget = memory_budget_mb * 1024 * 1024 if memory_budget_mb else None
+    jobs = iter(jobs)
+    window = workers * QUEUE_DEPTH
+    exhausted = False
+    waiting = None  # (input_path, output_dir, bytes) fetched but held back until memory frees up
+    memory_in_use = 0
+    with ProcessPoolExecutor(max_workers=workers, initializer=init_worker) as executor:
+        pending = {}
+        while True:
+            skipped = []
+            while not exhausted and len(pending) < window and len(skipped) < window:
+                if cancel_event is not None and cancel_event.is_set():
+                    exhausted = True
+                    break
+                if waiting is None:
+                    job = next(jobs, None)
+                    if job is None:
+                        exhausted = True
+                        break
+                    input_path, output_dir = job
+                    if skip_existing and is_up_to_date(input_path, expected_outputs(
+                        input_path, output_dir, options.get("all_images", False),
+                        options.get("thumbnails", False), options.get("depth_images", False),
+                    )):
+                        skipped.append(input_path)
+                        continue
+                    memory = estimate_memory(input_path, options.get("all_images", False)) if memory_budget else 0
+                    waiting = (input_path, output_dir, memory)
+
+                input_path, output_dir, memory = waiting
+                if memory_budget and pending and memory_in_use + memory > memory_budget:
+                    break
+                future = executor.submit(convert_heic_to_jpeg, input_path, output_dir, quality, **options)
+                pending[future] = (input_path, memory)
+                memory_in_use += memory
+                waiting = None
+
+            for input_path in skipped:
+                yield input_path, "skipped"
+            if not pending:
+                if exhausted:
+                    return
+                continue
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                input_path, memory = pending.pop(future)
+                memory_in_use -= memory
+                yield input_path, "converted" if future.result() else "failed"
+
+def convert_many(files, output_dir, quality, workers=None, cancel_event=None, skip_existing=False, **options):
+    """Converts the given HEIC files into one output folder. See convert_jobs."""
+    jobs = ((path, output_dir) for path in files)
+    return convert_jobs(jobs, quality, workers, cancel_event, skip_existing, **options)
+
+def convert_tree(source_dir, output_dir, quality, workers=None, cancel_event=None, skip_existing=True, **options):
+    """Converts every HEIC under `source_dir`, mirroring its folders in `output_dir`. See convert_jobs."""
+    return convert_jobs(tree_jobs(source_dir, output_dir), quality, workers, cancel_event, skip_existing, **options)
+
+def start_conversion(jobs, quality, progress_queue, cancel_event, workers=None, **options):
+    """Runs convert_jobs on a background thread so a GUI stays responsive. Returns the thread.
+
+    Messages put on `progress_queue`:
+      ("progress", done, total, input_path, status) after each file
+      ("done", converted, done, total, cancelled) when the batch ends
+      ("error", message) if the pool itself failed
+    """
+    def run():
+        done = converted = total = 0
+        try:
+            # Listing a big tree takes a while, so it happens here rather than on the caller's (UI) thread
+            batch = list(jobs)
+            total = len(batch)
+            for path, status in convert_jobs(batch, quality, workers, cancel_event, **options):
+                done += 1
+                converted += status == "converted"
+                progress_queue.put(("progress", done, total, path, status))
+        except Exception as e:
+            progress_queue.put(("error", str(e)))
+        progress_queue.put(("done", converted, done, total, cancel_event.is_set()))
+
+    thread = threading.Thread(target=run, name="heic-conversion", daemon=True)
+    thread.start()
+    return thread
+
+# === Command Line ===
+def parse_args():
+    parser = argparse.ArgumentParser(description="Convert HEIC images to JPEG.")
+    parser.add_argument("sources", nargs="+", help="HEIC files, or folders to convert recursively")
+    parser.add_argument("output", help="output folder; source folder structure is recreated inside it")
+    parser.add_argument("-q", "--quality", type=int, default=DEFAULT_QUALITY, help="JPEG quality (1-100)")
+    parser.add_argument("-j", "--workers", type=int, default=WORKERS, help="parallel conversions")
+    parser.add_argument("--max-size", type=int, help="scale images down to fit within this many pixels (thumbnails)")
+    parser.add_argument("--all-images", action="store_true", help="also export burst frames and other images in the container")
+    parser.add_argument("--thumbnails", action="store_true", help="also export embedded thumbnails")
+    parser.add_argument("--depth", action="store_true", help="also export depth maps (PNG)")
+    parser.add_argument("--memory-budget", type=int, default=MEMORY_BUDGET_MB, help="MB of decoded images allowed in flight across all workers")
+    parser.add_argument("--force", action="store_true", help="convert even if an up-to-date JPEG exists")
+    return parser.parse_args()
+
+def iter_cli_jobs(sources, output_dir):
+    for source in sources:
+        if os.path.isdir(source):
+            yield from tree_jobs(source, output_dir)
+        else:
+            yield source, output_dir
+
+def main():
+    args = parse_args()
+    cancel_event = threading.Event()
+
+    def request_cancel(signum, frame):
+        print("Cancelling: waiting for the images already converting...")
+        cancel_event.set()
+
+    signal.signal(signal.SIGINT, request_cancel)
+
+    counts = {"converted": 0, "skipped": 0, "failed": 0}
+    jobs = iter_cli_jobs(args.sources, args.output)
+    for i, (_, status) in enumerate(
+        convert_jobs(
+            jobs, args.quality, max(1, args.workers), cancel_event, skip_existing=not args.force,
+            memory_budget_mb=args.memory_budget, max_size=args.max_size, all_images=args.all_images,
+            thumbnails=args.thumbnails, depth_images=args.depth,
+        ), 1
+    ):
+        counts[status] += 1
+        if i % PROGRESS_EVERY == 0:
+            print(f"{i} files: {counts['converted']} converted, {counts['skipped']} skipped, {counts['failed']} failed")
+
+    print(f"Done{' (cancelled)' if cancel_event.is_set() else ''}: "
+          f"{counts['converted']} converted, {counts['skipped']} skipped, {counts['failed']} failed")
+    return 1 if counts["failed"] or cancel_event.is_set() else 0
+
+if __name__ == "__main__":
+    sys.exit(main())